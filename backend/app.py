@@ -1,23 +1,164 @@
-import os, math, sys, shutil
+import os, sys, shutil
 import argparse
-import subprocess
-import open3d as o3d
-from tqdm import tqdm
-from scipy.spatial.transform import Slerp, Rotation
+import multiprocessing
+import queue
+import json
+import time
+from collections import OrderedDict
 import numpy as np
+# open3d, scipy, transforms3d and vedo are imported by the functions using them, so encoding
+# (render subcommand) and the backend service start without loading them
 from utils.read_write_colmap_model import *
-from vedo import show, Line, Arrow, Axes, Sphere
-from transforms3d.quaternions import qmult, qinverse, qnorm, qlog, qexp
-from imageio_ffmpeg import get_ffmpeg_exe
+from utils.pose_interpolation import interpolate_trajectory, resample_trajectory, prune_keyframes, KEYFRAME_PRUNING_METHODS
+from utils.trajectory import Trajectory, as_trajectory
+from utils.scene_cache import SceneCache, scene_cache_key, save_scene, load_scene, publish_file, replacing
+from utils.frame_manifest import FrameManifest, frame_keys, array_hash
+from utils.lod import build_lods, write_lods, write_ply_binary, pick_lod, LOD_MANIFEST_NAME
+from utils.ffmpeg_stream import FFmpegRawVideoWriter, concat_videos, run_ffmpeg, float_to_rgb24, depth_to_gray16, DEPTH_VIDEO_ARGS, DRAFT_VIDEO_ARGS
+from utils.profiling import StageProfiler
+from utils.progress import ProgressReporter, set_progress_format, PROGRESS_FORMATS
+from utils.jsonrpc import serve
+from utils.splat_renderer import PointSplatRenderer, write_png
+from utils.voxel_index import load_or_build_index, VOXEL_INDEX_NAME
+from utils.distortion import load_or_build_remap
+from utils.preview_stream import write_preview, PREVIEW_NAME
+from utils.ply_stream import PlyVertexWriter, read_ply_binary
+from utils.outlier_removal import clean_points, cleaning_key, observation_mask, OUTLIER_METHODS
 
 def createPlyColmap(colmap_points):
-    xyz = [v.xyz for k, v in colmap_points.items()]
-    rgb = [v.rgb/[255, 255, 255] for k, v in colmap_points.items()]
+    """Builds an open3d point cloud from a Points3DArrays (or a legacy dict of Point3D)"""
+    import open3d as o3d
+    if isinstance(colmap_points, dict):
+        colmap_points = points3D_to_arrays(colmap_points)
+    xyz = colmap_points.xyz
+    rgb = colmap_points.rgb / 255.0
     pcd = o3d.geometry.PointCloud()
     pcd.points = o3d.utility.Vector3dVector(xyz)
     pcd.colors = o3d.utility.Vector3dVector(rgb)
     return pcd    
 
+def load_colmap_scene(colmap_dir, scene_cache=None):
+    """Loads cameras, images and points of a COLMAP model, going through the scene cache when given.
+
+    Returns (cameras, images, points, entry_dir) or None when no model is found; images
+    is an ImagePoses sorted by frame timestamp and entry_dir the cache entry of the
+    scene (None without a cache).
+    """
+    key = scene_cache_key(colmap_dir) if scene_cache is not None else None
+    entry_dir = scene_cache.get(key) if key else None
+    if entry_dir:
+        print("Loading cached colmap scene")
+        return (*load_scene(entry_dir), entry_dir)
+    colmap_model = read_model_arrays(colmap_dir, poses_only=True)
+    if colmap_model is None:
+        return None
+    if key:
+        entry_dir = scene_cache.put(key, lambda d: save_scene(d, *colmap_model))
+    return (*colmap_model, entry_dir)
+
+def write_point_cloud(path, colmap_points, pcd=None):
+    """Writes the open3d point cloud pcd to path, or colmap_points with the PLY writer of utils.lod without open3d"""
+    if pcd is None:
+        write_ply_binary(path, colmap_points.xyz, colmap_points.rgb)
+        return
+    import open3d as o3d
+    with replacing(path) as tmp:
+        o3d.io.write_point_cloud(tmp, pcd, write_ascii=False)
+
+def write_scene_ply(colmap_points, out_path, entry_dir=None, pcd=None):
+    """Writes the point cloud to out_path, reusing the PLY cached in entry_dir when there is one"""
+    if entry_dir is None:
+        # out_path may still be a hard link into the cache from an earlier run
+        write_point_cloud(out_path, colmap_points, pcd)
+        return
+    cached_ply = os.path.join(entry_dir, "pointcloud.ply")
+    if not os.path.exists(cached_ply):
+        write_point_cloud(cached_ply, colmap_points, pcd)
+    publish_file(cached_ply, out_path)
+
+def write_scene_lods(colmap_points, outputs_dir, budgets, entry_dir=None):
+    """Writes voxel-downsampled levels of detail next to pointcloud.ply and returns the LOD manifest.
+
+    Levels are built in (and reused from) the scene cache entry when there is one.
+    """
+    lod_dir = entry_dir or outputs_dir
+    manifest_path = os.path.join(lod_dir, LOD_MANIFEST_NAME)
+    wanted = sorted(b for b in budgets if b < len(colmap_points.xyz))
+    manifest = None
+    if entry_dir is not None and os.path.exists(manifest_path):
+        with open(manifest_path) as fid:
+            manifest = json.load(fid)
+        if [level["budget"] for level in manifest["levels"]] != wanted:
+            manifest = None
+    if manifest is None:
+        print(f"Building {len(wanted)} levels of detail...")
+        levels = build_lods(colmap_points.xyz, colmap_points.rgb, wanted)
+        manifest = write_lods(levels, lod_dir, include_full=len(wanted) < len(budgets))
+    if entry_dir is not None:
+        for level in manifest["levels"]:
+            publish_file(os.path.join(entry_dir, level["file"]), os.path.join(outputs_dir, level["file"]))
+        publish_file(manifest_path, os.path.join(outputs_dir, LOD_MANIFEST_NAME))
+    return manifest
+
+def write_scene_preview(colmap_points, outputs_dir, entry_dir=None):
+    """Writes the quantized preview stream of the app next to pointcloud.ply, reusing the one in entry_dir when there is one"""
+    out_path = os.path.join(outputs_dir, PREVIEW_NAME)
+    if entry_dir is None:
+        write_preview(out_path, colmap_points.xyz, colmap_points.rgb)
+        return
+    cached_preview = os.path.join(entry_dir, PREVIEW_NAME)
+    if not os.path.exists(cached_preview):
+        write_preview(cached_preview, colmap_points.xyz, colmap_points.rgb)
+    publish_file(cached_preview, out_path)
+
+def remove_scene_previews(outputs_dir):
+    """Deletes the preview stream and levels of detail in outputs_dir, which the app would otherwise show for a new pointcloud.ply"""
+    manifest_path = os.path.join(outputs_dir, LOD_MANIFEST_NAME)
+    paths = [os.path.join(outputs_dir, PREVIEW_NAME), manifest_path]
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as fid:
+            paths += [os.path.join(outputs_dir, level["file"]) for level in json.load(fid)["levels"]]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def convert_points3D_ply(colmap_dir, out_path, chunk_points=1000000, max_error=0, min_track_length=0):
+    """Streams points3D.bin (or .txt) into a binary PLY chunk by chunk and returns the number of points written.
+
+    Memory use is bounded by chunk_points whatever the size of the model. Points can
+    be filtered by reprojection error and track length on the way.
+    """
+    for ext, read_chunks in ((".bin", iter_points3D_binary_chunks), (".txt", iter_points3D_text_chunks)):
+        points_path = os.path.join(colmap_dir, "points3D" + ext)
+        if os.path.isfile(points_path):
+            break
+    else:
+        sys.exit(f"No points3D.bin or points3D.txt found in {colmap_dir}")
+    with PlyVertexWriter(out_path) as writer:
+        for points in read_chunks(points_path, chunk_points):
+            keep = observation_mask(points, max_error, min_track_length)
+            writer.write(points.xyz[keep], points.rgb[keep])
+    return writer.count
+
+def draft_point_cloud(colmap_points, lod_manifest, outputs_dir, budget, sampling="voxel", seed=0):
+    """(xyz, rgb) of at most budget points for draft renders: the finest level of detail that fits, or a random subset"""
+    xyz, rgb = colmap_points.xyz, colmap_points.rgb
+    if budget <= 0 or len(xyz) <= budget:
+        return xyz, rgb
+    if sampling == "voxel":
+        fitting = [level for level in lod_manifest["levels"] if level["points"] <= budget]
+        if fitting:
+            return read_ply_binary(os.path.join(outputs_dir, fitting[-1]["file"]))
+    index = np.sort(np.random.default_rng(seed).choice(len(xyz), budget, replace=False))
+    return np.asarray(xyz)[index], np.asarray(rgb)[index]
+
+def draft_intrinsics(width, height, fx, fy, cx, cy, scale):
+    """Intrinsics scaled to a draft resolution, kept even for yuv420p"""
+    draft_width = max(2, 2 * int(round(width * scale / 2)))
+    draft_height = max(2, 2 * int(round(height * scale / 2)))
+    sx, sy = draft_width / width, draft_height / height
+    return draft_width, draft_height, fx * sx, fy * sy, cx * sx, cy * sy
+
 def qvec2rotmat(qvec):
     return np.array([
         [1 - 2 * qvec[2]**2 - 2 * qvec[3]**2,
@@ -58,6 +199,7 @@ def get_background_colour(colour):
         return [255, 255, 255]
 
 def visualise_debugger(newposes, oldposes):
+    from vedo import show, Arrow, Sphere
     apexes = [pose[:3, 3] for pose in newposes]
     old_apexes = [pose[:3, 3] for pose in oldposes]
 
@@ -80,16 +222,73 @@ def visualise_debugger(newposes, oldposes):
 
     show(camera_apexes, camera_original_apexes, camera_axes)
 
-def custom_draw_geometry_with_camera_trajectory(pcd, poses, width, height, fx, fy, cx, cy, background_color, render_folder):
+def capture_frame(vis, index, render_folder, save_frames=True, writer=None, render_depth=False, depth_writer=None,
+                  distortion=None, background_color=(0, 0, 0)):
+    """Captures the current view as PNG files and/or into streaming video writers. Depth is only read back when render_depth is set"""
+    if distortion is not None:
+        rgb = float_to_rgb24(vis.capture_screen_float_buffer(True))
+        depth = np.asarray(vis.capture_depth_float_buffer(True)) if render_depth else None
+        write_frame(index, render_folder, *distort_frame(distortion, rgb, depth, background_color), save_frames, writer, depth_writer)
+        return
+    if save_frames:
+        if render_depth:
+            vis.capture_depth_image(f"{render_folder}/depth/{index:05d}.png", True)
+        vis.capture_screen_image(f"{render_folder}/image/{index:05d}.png", True)
+    if writer is not None:
+        writer.write(float_to_rgb24(vis.capture_screen_float_buffer(True)))
+    if depth_writer is not None:
+        depth_writer.write(depth_to_gray16(vis.capture_depth_float_buffer(True)))
+
+def distort_frame(distortion, rgb, depth, background_color):
+    """Remaps a rendered pinhole frame (and depth) to the lens of an OPENCV camera"""
+    rgb = distortion.apply(rgb, fill=np.clip(background_color, 0, 255).astype(np.uint8))
+    if depth is not None:
+        depth = distortion.apply(depth, nearest=True)
+    return rgb, depth
+
+def write_frame(index, render_folder, rgb, depth=None, save_frames=True, writer=None, depth_writer=None):
+    """Writes an rgb24 frame and optional depth in metres as PNG files and/or into streaming video writers"""
+    if save_frames:
+        write_png(f"{render_folder}/image/{index:05d}.png", rgb)
+        if depth is not None:
+            write_png(f"{render_folder}/depth/{index:05d}.png", depth_to_gray16(depth))
+    if writer is not None:
+        writer.write(rgb)
+    if depth_writer is not None:
+        depth_writer.write(depth_to_gray16(depth))
+
+def open_video_writers(video_path, fps, render_depth=False, depth_video_path=None, video_args=None):
+    """Opens the rgb and (optional) depth stream writers. video_args replaces the rgb encoder arguments"""
+    writer = None
+    if video_path:
+        writer = FFmpegRawVideoWriter(video_path, fps, output_args=video_args) if video_args else FFmpegRawVideoWriter(video_path, fps)
+    depth_writer = None
+    if render_depth and depth_video_path:
+        depth_writer = FFmpegRawVideoWriter(depth_video_path, fps, pix_fmt="gray16le", output_args=DEPTH_VIDEO_ARGS)
+    return writer, depth_writer
+
+def close_video_writers(*writers):
+    for writer in writers:
+        if writer is not None:
+            writer.close()
+
+def custom_draw_geometry_with_camera_trajectory(pcd, poses, width, height, fx, fy, cx, cy, background_color, render_folder,
+                                                save_frames=True, video_path=None, fps=None, render_depth=False, depth_video_path=None,
+                                                frame_ids=None, distortion=None, video_args=None):
+    import open3d as o3d
     # reset state
     custom_draw_geometry_with_camera_trajectory.index = -1
-    custom_draw_geometry_with_camera_trajectory.trajectory = poses
+    custom_draw_geometry_with_camera_trajectory.trajectory = np.asarray(poses)
+    if frame_ids is None:
+        frame_ids = range(len(poses))
 
     # make sure these dirs really exist
     os.makedirs(f"{render_folder}/image/", exist_ok=True)
-    os.makedirs(f"{render_folder}/depth/", exist_ok=True)
+    if render_depth:
+        os.makedirs(f"{render_folder}/depth/", exist_ok=True)
 
-    pbar = tqdm(total=len(poses), desc="Creating frames...", unit="frame", file=sys.stdout)
+    pbar = ProgressReporter("render", len(poses), desc="Creating frames...")
+    writer, depth_writer = open_video_writers(video_path, fps, render_depth, depth_video_path, video_args)
 
     def move_forward(vis):
         glb = custom_draw_geometry_with_camera_trajectory
@@ -97,9 +296,9 @@ def custom_draw_geometry_with_camera_trajectory(pcd, poses, width, height, fx, f
 
         # capture after the first move
         if glb.index >= 0:
-            print(f"Capture image {glb.index:05d}")
-            vis.capture_depth_image(f"{render_folder}/depth/{glb.index:05d}.png", True)
-            vis.capture_screen_image(f"{render_folder}/image/{glb.index:05d}.png", True)
+            print(f"Capture image {frame_ids[glb.index]:05d}")
+            capture_frame(vis, frame_ids[glb.index], render_folder, save_frames, writer, render_depth, depth_writer,
+                          distortion, background_color)
 
         glb.index += 1
         if glb.index < len(glb.trajectory):
@@ -116,12 +315,157 @@ def custom_draw_geometry_with_camera_trajectory(pcd, poses, width, height, fx, f
             return False
 
     vis = o3d.visualization.Visualizer()
-    vis.create_window(visible=False)
+    # the framebuffer must match the intrinsics, open3d defaults to 1920x1080
+    vis.create_window(width=width, height=height, visible=False)
     vis.add_geometry(pcd)
     vis.get_render_option().background_color = background_color
     vis.register_animation_callback(move_forward)
     vis.run()
     vis.destroy_window()
+    close_video_writers(writer, depth_writer)
+
+_render_worker_state = {}
+
+def _init_render_worker(points, colors, width, height, fx, fy, cx, cy, background_color, progress_queue, distortion=None):
+    """Builds the point cloud and a hidden visualiser once per render worker process"""
+    import open3d as o3d
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(points)
+    pcd.colors = o3d.utility.Vector3dVector(colors)
+    vis = o3d.visualization.Visualizer()
+    vis.create_window(width=width, height=height, visible=False)
+    vis.add_geometry(pcd)
+    vis.get_render_option().background_color = background_color
+    _render_worker_state.update(
+        vis=vis, pcd=pcd, progress_queue=progress_queue, distortion=distortion, background_color=background_color,
+        intrinsic=o3d.camera.PinholeCameraIntrinsic(width, height, fx, fy, cx, cy))
+
+def _render_shard(shard_frame_ids, shard_poses, render_folder, save_frames=True, segment_path=None, fps=None,
+                  render_depth=False, depth_segment_path=None):
+    """Renders a contiguous shard of the trajectory, naming frames by their global index.
+
+    When segment_path is given, the shard is also streamed into its own video segment.
+    """
+    import open3d as o3d
+    state = _render_worker_state
+    vis = state["vis"]
+    ctr = vis.get_view_control()
+    writer, depth_writer = open_video_writers(segment_path, fps, render_depth, depth_segment_path)
+    for index, pose in zip(shard_frame_ids, np.asarray(shard_poses)):
+        index = int(index)
+        params = o3d.camera.PinholeCameraParameters()
+        params.intrinsic = state["intrinsic"]
+        params.extrinsic = pose
+        ctr.convert_from_pinhole_camera_parameters(params, True)
+        vis.poll_events()
+        vis.update_renderer()
+        capture_frame(vis, index, render_folder, save_frames, writer, render_depth, depth_writer,
+                      state["distortion"], state["background_color"])
+        state["progress_queue"].put(1)
+    close_video_writers(writer, depth_writer)
+    return len(shard_poses)
+
+def close_render_pool(pool_cache):
+    """Shuts down the render workers kept in pool_cache"""
+    if pool_cache and pool_cache.get("pool") is not None:
+        pool_cache["pool"].terminate()
+        pool_cache["pool"].join()
+    if pool_cache is not None:
+        pool_cache.clear()
+
+def render_trajectory_parallel(pcd, poses, width, height, fx, fy, cx, cy, background_color, render_folder, num_workers,
+                               save_frames=True, video_path=None, fps=None, render_depth=False, depth_video_path=None,
+                               frame_ids=None, pool_cache=None, distortion=None):
+    """Splits the poses into contiguous shards rendered by num_workers processes, each with its own hidden window.
+
+    Output frames use the same %05d.png naming as custom_draw_geometry_with_camera_trajectory.
+    When streaming, every shard is encoded to its own segment and the segments are
+    joined into video_path without re-encoding. With a pool_cache dict, the workers
+    and their windows are kept alive and reused by later calls with the same point
+    cloud and render settings.
+    """
+    os.makedirs(f"{render_folder}/image/", exist_ok=True)
+    if render_depth:
+        os.makedirs(f"{render_folder}/depth/", exist_ok=True)
+
+    poses = as_trajectory(poses)
+    frame_ids = np.arange(len(poses)) if frame_ids is None else np.asarray(frame_ids)
+    pool_size = max(1, num_workers if pool_cache is not None else min(num_workers, len(poses)))
+    num_workers = max(1, min(num_workers, len(poses)))
+    shards = [shard for shard in np.array_split(np.arange(len(poses)), num_workers) if len(shard) > 0]
+    segment_paths = [f"{render_folder}/segments/{i:03d}.mp4" if video_path else None for i in range(len(shards))]
+    depth_segment_paths = [f"{render_folder}/segments/depth_{i:03d}.mkv" if render_depth and depth_video_path else None
+                           for i in range(len(shards))]
+
+    # spawn keeps each worker's GL context independent of the parent process
+    ctx = multiprocessing.get_context("spawn")
+    settings = (pool_size, width, height, fx, fy, cx, cy, tuple(background_color), distortion.params if distortion else None)
+    if pool_cache and pool_cache.get("pcd") is pcd and pool_cache.get("settings") == settings:
+        pool, progress_queue = pool_cache["pool"], pool_cache["queue"]
+    else:
+        close_render_pool(pool_cache)
+        progress_queue = ctx.Queue()
+        initargs = (np.asarray(pcd.points), np.asarray(pcd.colors), width, height, fx, fy, cx, cy,
+                    background_color, progress_queue, distortion)
+        pool = ctx.Pool(pool_size, initializer=_init_render_worker, initargs=initargs)
+        if pool_cache is not None:
+            pool_cache.update(pcd=pcd, settings=settings, pool=pool, queue=progress_queue)
+    pbar = ProgressReporter("render", len(poses), desc=f"Creating frames ({num_workers} workers)...")
+    try:
+        result = pool.starmap_async(_render_shard, [(frame_ids[shard], poses[shard], render_folder, save_frames, segment_path, fps,
+                                                     render_depth, depth_segment_path)
+                                                    for shard, segment_path, depth_segment_path in zip(shards, segment_paths, depth_segment_paths)])
+        while not result.ready():
+            try:
+                pbar.update(progress_queue.get(timeout=0.5))
+            except queue.Empty:
+                pass
+        result.get()
+        while not progress_queue.empty():
+            pbar.update(progress_queue.get())
+    except BaseException:
+        close_render_pool(pool_cache)
+        raise
+    finally:
+        if pool_cache is None:
+            pool.terminate()
+            pool.join()
+    pbar.close()
+    if video_path:
+        concat_videos(segment_paths, video_path)
+    if render_depth and depth_video_path:
+        concat_videos(depth_segment_paths, depth_video_path)
+    if os.path.exists(f"{render_folder}/segments"):
+        shutil.rmtree(f"{render_folder}/segments")
+    print("Finished")
+
+def render_trajectory_splat(points, colors, poses, width, height, fx, fy, cx, cy, background_color, render_folder, point_size=1,
+                            save_frames=True, video_path=None, fps=None, render_depth=False, depth_video_path=None,
+                            frame_ids=None, far=None, voxel_index=None, distortion=None, video_args=None):
+    """Renders the poses with the numpy point splatting renderer, which needs no display or GPU.
+
+    Frames, depth and streamed videos are written like custom_draw_geometry_with_camera_trajectory does.
+    With a voxel_index of the points, every frame only projects the points inside its view frustum.
+    With a distortion remap, frames are rendered on its enlarged pinhole canvas and remapped to the lens.
+    """
+    poses = as_trajectory(poses)
+    frame_ids = range(len(poses)) if frame_ids is None else frame_ids
+    os.makedirs(f"{render_folder}/image/", exist_ok=True)
+    if render_depth:
+        os.makedirs(f"{render_folder}/depth/", exist_ok=True)
+    if distortion is not None:
+        width, height, fx, fy, cx, cy = distortion.source_intrinsics(fx, fy, cx, cy)
+    renderer = PointSplatRenderer(points, colors, width, height, fx, fy, cx, cy, background_color, point_size, far=far, index=voxel_index)
+    writer, depth_writer = open_video_writers(video_path, fps, render_depth, depth_video_path, video_args)
+    with ProgressReporter("render", len(poses), desc="Creating frames (numpy)...") as pbar:
+        for index, pose in zip(frame_ids, poses):
+            rgb, depth = renderer.render(pose, render_depth)
+            if distortion is not None:
+                rgb, depth = distort_frame(distortion, rgb, depth, background_color)
+            write_frame(index, render_folder, rgb, depth, save_frames, writer, depth_writer)
+            pbar.update(1)
+    close_video_writers(writer, depth_writer)
+    print("Finished")
 
 def catmul_romm(t0, t1, t2, t3, t=0.5):
     """Translational interpolation for a point exactly in between t1 and t2"""
@@ -137,6 +481,8 @@ def ensure_shortest_path(q1, q2):
     return q2
 
 def squad(q0, q1, q2, q3, t=0.5):
+    from scipy.spatial.transform import Slerp, Rotation
+    from transforms3d.quaternions import qmult, qinverse, qlog, qexp
     q0 = normalise_quaternion(q0)
     q1 = normalise_quaternion(q1)
     q2 = normalise_quaternion(q2)
@@ -223,87 +569,379 @@ def interpolation_alg(poses):
         newposes.append(c2w)
     return newposes, traj_gap
 
-def interpolate_poses(newposes):
-    traj_gap = True
-    while traj_gap:
-        newposes, traj_gap = interpolation_alg(newposes)
+def interpolate_poses(newposes, threshold=0.5):
+    """Fills every gap larger than threshold (metres) with vectorized interpolation passes.
 
-    print(len(newposes))    
+    Gives the same trajectory as repeating interpolation_alg until no gap is left,
+    within floating point tolerance of the spline evaluation. Returns a Trajectory.
+    """
+    print(len(newposes))
+    newposes = interpolate_trajectory(newposes, threshold)
+    print(len(newposes))
     return newposes
 
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Renders video from input point cloud and poses")
+def resample_poses(poses, fps, nseconds):
+    """Samples exactly fps*nseconds poses at constant speed along the keyframe spline, as a Trajectory"""
+    n_frames = max(int(round(fps * nseconds)), 1)
+    print(f"Resampling {len(poses)} keyframes to {n_frames} frames ({fps} fps for {nseconds} s)")
+    return resample_trajectory(poses, n_frames)
+
+def encode_frames(render_folder, outputs_dir, fps, render_depth=False):
+    """Encodes the PNG frames in render_folder to rgb.mp4 (and depth.mkv when render_depth is set)"""
+    base = os.path.abspath(render_folder)
+    img_seq = os.path.join(base, "image", "%05d.png")
+    depth_seq = os.path.join(base, "depth", "%05d.png")
+
+    if os.path.exists(f"{outputs_dir}/rgb.mp4"):
+        os.remove(f"{outputs_dir}/rgb.mp4")
+    n_frames = len([name for name in os.listdir(os.path.join(base, "image")) if name.endswith(".png")])
+
+    print("Running ffmpeg")
+    with ProgressReporter("encode", n_frames, desc="Encoding rgb.mp4") as progress:
+        run_ffmpeg(['-framerate', str(fps), '-i', img_seq, '-pix_fmt', 'yuv420p', f'{outputs_dir}/rgb.mp4'], progress)
+
+    # open3d depth PNGs are 16-bit millimetres, kept lossless in the depth video
+    if render_depth and os.path.exists(os.path.join(base, "depth", "00000.png")):
+        print("Running ffmpeg for depth")
+        with ProgressReporter("encode_depth", n_frames, desc="Encoding depth.mkv") as progress:
+            run_ffmpeg(['-y', '-framerate', str(fps), '-i', depth_seq, *DEPTH_VIDEO_ARGS, f'{outputs_dir}/depth.mkv'], progress)
+
+def encode_stale_frames(manifest, outputs_dir, fps, render_depth, profiler):
+    """Encodes the frames of manifest unless the videos in outputs_dir were already encoded from them with the same settings"""
+    video = {"fps": fps, "depth": render_depth}
+    videos = [f"{outputs_dir}/rgb.mp4"] + ([f"{outputs_dir}/depth.mkv"] if render_depth else [])
+    if manifest.video == video and all(os.path.exists(path) for path in videos):
+        print("rgb.mp4 is already up to date with the rendered frames")
+        return
+    with profiler.stage("encode_video", len(manifest.keys), "frames"):
+        encode_frames(manifest.render_folder, outputs_dir, fps, render_depth)
+    manifest.encoded(video)
+
+def render_draft(args, colmap_points, lod_manifest, outputs_dir, poses, width, height, fx, fy, cx, cy, background_colour, fps, profiler):
+    """Renders outputs/preview.mp4 at --draft_scale resolution from --draft_points points and every --draft_stride-th pose.
+
+    Frames are streamed into a fast encoder and never saved, so rgb.mp4, the frames in
+    renders/ and their manifest are left as they are. The preview keeps the duration of
+    the full video. Lens distortion is not applied to drafts.
+    """
+    stride = max(int(args.draft_stride), 1)
+    draft_poses = as_trajectory(poses)[::stride]
+    width, height, fx, fy, cx, cy = draft_intrinsics(width, height, fx, fy, cx, cy, float(args.draft_scale))
+    with profiler.stage("draft_points", len(colmap_points.xyz), "points"):
+        xyz, rgb = draft_point_cloud(colmap_points, lod_manifest, outputs_dir, int(args.draft_points), args.draft_sampling)
+    print(f"Rendering draft of {len(draft_poses)} frames at {width}x{height} from {len(xyz)} points")
+    draft_folder = os.path.join(outputs_dir, "draft")
+    render_kwargs = dict(save_frames=False, video_path=os.path.join(outputs_dir, "preview.mp4"), fps=max(int(round(fps / stride)), 1),
+                         video_args=DRAFT_VIDEO_ARGS)
+    with profiler.stage("render_draft", len(draft_poses), "frames"):
+        if args.renderer == "numpy":
+            render_trajectory_splat(xyz, rgb, draft_poses, width, height, fx, fy, cx, cy, background_colour, draft_folder,
+                                    int(args.point_size), far=float(args.render_far) or None, **render_kwargs)
+        else:
+            pcd = createPlyColmap(Points3DArrays(ids=None, xyz=xyz, rgb=rgb, error=None, track_offsets=None, image_ids=None,
+                                                 point2D_idxs=None))
+            custom_draw_geometry_with_camera_trajectory(pcd, draft_poses, width, height, fx, fy, cx, cy, background_colour,
+                                                        draft_folder, **render_kwargs)
+    shutil.rmtree(draft_folder, ignore_errors=True)
+
+class BackendState:
+    """Objects kept warm by the backend service between requests: parsed scenes, point clouds and render workers"""
+
+    def __init__(self, max_entries=8):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.render_pool = {}
+
+    def cached(self, key, build):
+        """Returns the object stored under key, calling build() on a miss. The least recently used objects are dropped first"""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = build()
+        if value is not None:
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def close(self):
+        close_render_pool(self.render_pool)
+        self.entries.clear()
+
+def cached(state, key, build):
+    """state.cached(key, build) in the backend service, build() for a one-off command line run"""
+    return state.cached(key, build) if state is not None else build()
+
+def service_methods(state):
+    """JSON-RPC methods of the backend service. generate_frames, render_video and run take argv, the command line flags"""
+    def command(flags):
+        def method(argv=()):
+            start = time.perf_counter()
+            args, unknown = build_parser().parse_known_args([*flags, *argv])
+            if unknown:
+                raise ValueError(f"Unrecognized arguments: {' '.join(unknown)}")
+            run(args, state)
+            return {"wall_s": time.perf_counter() - start}
+        return method
+    return {
+        "generate_frames": command(["--generate_frames"]),
+        "render_video": command(["--render_rgb"]),
+        "convert_ply": command(["--convert_ply"]),
+        "run": command([]),
+        "ping": lambda: "pong",
+        "shutdown": state.close,
+    }
+
+def build_parser():
+    """Command line of the backend: generate, render, convert and serve subcommands sharing one set of options.
+
+    The --generate_frames, --render_rgb, --convert_ply and --serve flags select the same modes without a subcommand.
+    """
+    options = argparse.ArgumentParser(add_help=False)
     #Render output
-    parser.add_argument("--nseconds", default="60", help="Length of video (s)")
-    parser.add_argument("--background_colour", default="black", help="Background colour for video")
+    options.add_argument("--nseconds", default="60", help="Length of video (s)")
+    options.add_argument("--fps", default=None, help="Frame rate of video. With --trajectory_mode arclength, fps*nseconds poses are rendered")
+    options.add_argument("--trajectory_mode", default="gap", choices=["gap", "arclength"], help="gap: fill gaps over 0.5 m between keyframes, arclength: constant speed resampling to fps*nseconds poses")
+    options.add_argument("--keyframe_pruning", default="none", choices=KEYFRAME_PRUNING_METHODS, help="Drop redundant COLMAP poses before interpolation: tolerance (poses within the tolerances of the last kept one) or douglas_peucker (poses within the tolerances of the path between kept ones, best with --trajectory_mode arclength)")
+    options.add_argument("--keyframe_translation_tol", default="0.05", help="Camera centre tolerance of --keyframe_pruning in metres (0 = ignore translation)")
+    options.add_argument("--keyframe_rotation_tol", default="2", help="Rotation tolerance of --keyframe_pruning in degrees (0 = ignore rotation, both tolerances 0 = keep every pose)")
+    options.add_argument("--background_colour", default="black", help="Background colour for video")
+    options.add_argument("--renderer", default="open3d", choices=["open3d", "numpy"], help="open3d: hidden open3d window (needs a display), numpy: CPU point splatting, no display or GPU needed")
+    options.add_argument("--point_size", default="1", help="Size of the rendered points in pixels (numpy renderer)")
+    options.add_argument("--render_far", default="0", help="Do not draw points farther than this from the camera in metres (numpy renderer, 0 = no limit)")
+    options.add_argument("--frustum_culling", action=argparse.BooleanOptionalAction, default=True, help="Only project the points of a voxel grid index inside each frame's view frustum (numpy renderer)")
+    options.add_argument("--render_workers", default="1", help="Number of processes rendering frames in parallel with the open3d renderer (0 = one per CPU)")
+    options.add_argument("--render_depth", action="store_true", help="Also capture depth and encode it to depth.mkv (16-bit millimetres, FFV1)")
+    options.add_argument("--stream_video", action=argparse.BooleanOptionalAction, default=True, help="Encode rgb.mp4 while frames are rendered by piping them into ffmpeg")
+    options.add_argument("--save_frames", action="store_true", help="Also write PNG frames to renders/ (for a separate --render_rgb encode)")
+    options.add_argument("--draft", action="store_true", help="Quick look at the camera path: render a downscaled preview.mp4 from a subset of the points and poses, leaving the full render untouched")
+    options.add_argument("--draft_scale", default="0.25", help="Resolution of --draft frames relative to the COLMAP camera")
+    options.add_argument("--draft_points", default="200000", help="Point budget of --draft renders (0 = full cloud)")
+    options.add_argument("--draft_sampling", default="voxel", choices=["voxel", "random"], help="voxel: finest level of detail within --draft_points, random: random subset")
+    options.add_argument("--draft_stride", default="4", help="Render every Nth interpolated pose in --draft mode")
+    options.add_argument("--incremental", action="store_true", help="Keep PNG frames between runs and only re-render frames whose pose or render settings changed")
+    #Input
+    options.add_argument("--colmap_dir", help="Directory to colmap model files (.txt or .bin)")
+    options.add_argument("--output_dir", help="User directory to outputs folder")
+    options.add_argument("--max_reprojection_error", default="0", help="Drop points with a larger mean reprojection error in pixels before building the point cloud (0 = keep all)")
+    options.add_argument("--min_track_length", default="0", help="Drop points seen in fewer images before building the point cloud (0 = keep all)")
+    options.add_argument("--outlier_removal", default="none", choices=OUTLIER_METHODS, help="Drop floaters before building the point cloud: statistical (mean distance to the neighbours) or radius (neighbours within --outlier_radius)")
+    options.add_argument("--outlier_neighbors", default="20", help="Neighbours averaged by statistical outlier removal, or required within --outlier_radius by radius outlier removal")
+    options.add_argument("--outlier_std_ratio", default="2.0", help="Statistical outlier removal drops points whose mean neighbour distance is more than this many standard deviations above the average")
+    options.add_argument("--outlier_radius", default="0.05", help="Radius of radius outlier removal in metres")
+    options.add_argument("--chunk_points", default="1000000", help="Points read and written per chunk by the streaming PLY conversion, which bounds its memory use")
+    options.add_argument("--lod_budgets", default="100000,1000000,4000000", help="Comma separated point budgets of the voxel-downsampled preview levels")
+    options.add_argument("--render_point_budget", default="0", help="Render the finest level of detail with at most this many points (0 = full cloud)")
+    options.add_argument("--cache", action=argparse.BooleanOptionalAction, default=True, help="Cache parsed COLMAP scenes and their ply in outputs/cache")
+    options.add_argument("--cache_max_mb", default="2048", help="Size limit of the scene cache, least recently used scenes are evicted first")
+    #Diagnostics
+    options.add_argument("--progress", default="auto", choices=PROGRESS_FORMATS, help="Progress output: tqdm bar, JSON lines (for the app) or auto (bar on a terminal)")
+    options.add_argument("--profile", action="store_true", help="Print a JSON line with wall/cpu time, items and peak RSS after every stage")
+    options.add_argument("--profile_dir", default=None, help="With --profile, also dump cProfile stats of every stage to <profile_dir>/<stage>.prof")
+
+    parser = argparse.ArgumentParser(description="Renders video from input point cloud and poses", parents=[options])
     parser.add_argument("--generate_frames", action="store_true", help="Generates frames using colmap input")
     parser.add_argument("--render_rgb", action="store_true", help="Render rgb video")
-    #TODO future add option to get depth video from ffmpeg
-    #Input
-    parser.add_argument("--colmap_dir", help="Directory to colmap text files")
-    parser.add_argument("--output_dir", help="User directory to outputs folder")
-
-    #Load args
-    args = parser.parse_args()
+    parser.add_argument("--convert_ply", action="store_true", help="Stream points3D.bin/.txt into pointcloud.ply in chunks of --chunk_points, without loading the scene")
+    parser.add_argument("--serve", action="store_true", help="Stay running and answer JSON-RPC requests (one per line) on stdin, keeping scenes and render workers warm")
+    subparsers = parser.add_subparsers(dest="command", metavar="{generate,render,convert,serve}")
+    subparsers.add_parser("generate", parents=[options], help="Interpolate poses and render frames (same as --generate_frames)").set_defaults(generate_frames=True)
+    subparsers.add_parser("render", parents=[options], help="Encode rendered frames to rgb.mp4 without loading open3d (same as --render_rgb)").set_defaults(render_rgb=True)
+    subparsers.add_parser("convert", parents=[options], help="Convert points3D.bin/.txt to pointcloud.ply with bounded memory, applying --max_reprojection_error and --min_track_length (same as --convert_ply)").set_defaults(convert_ply=True)
+    subparsers.add_parser("serve", parents=[options], help="Run the JSON-RPC backend service (same as --serve)").set_defaults(serve=True)
+    return parser
+
+def run(args, state=None):
+    """Runs the stages selected by args. state keeps scenes and render workers warm between requests of the backend service"""
     nseconds = int(args.nseconds)
+    fps = int(args.fps) if args.fps else None
+    if args.trajectory_mode == "arclength" and fps is None:
+        fps = 30
+    render_workers = int(args.render_workers) or os.cpu_count() or 1
+    if args.generate_frames and not (args.stream_video or args.save_frames or args.incremental or args.draft):
+        sys.exit("--no-stream_video needs --save_frames (or --incremental), otherwise the rendered frames are not written anywhere")
     colmap_dir = args.colmap_dir
     if args.output_dir:
         outputs_dir = os.path.abspath(args.output_dir)
         render_folder = f'{outputs_dir}/renders'
     else:
         outputs_dir = './outputs'
-        render_folder = f'./renders'    
+        render_folder = './renders'
     background_colour = get_background_colour(args.background_colour)
     render_rgb = args.render_rgb
     poses_txt = f'{outputs_dir}/poses.txt'
+    profiler = StageProfiler(args.profile, args.profile_dir)
+    set_progress_format(args.progress)
+
 
+    #Convert huge models to ply without holding every point in memory
+    if args.convert_ply:
+        out_path = f"{outputs_dir}/pointcloud.ply"
+        os.makedirs(outputs_dir, exist_ok=True)
+        print("Converting points3D to ply...")
+        # they belong to the scene pointcloud.ply held before
+        remove_scene_previews(outputs_dir)
+        with profiler.stage("convert_ply", unit="points") as stage:
+            stage.items = convert_points3D_ply(colmap_dir, out_path, int(args.chunk_points),
+                                               float(args.max_reprojection_error), int(args.min_track_length))
+        print(f"Wrote {stage.items} points to {out_path}")
 
     #Colmap paths
     if args.generate_frames:
-        cameras_txt = f"{colmap_dir}/cameras.txt"
-        images_txt = f"{colmap_dir}/images.txt"
-        points3d_txt = f"{colmap_dir}/points3D.txt"
-        #Load colmap
+        #Load colmap (binary models are preferred when both formats exist)
         print("Loading colmap info")
-        colmap_cameras = read_cameras_text(cameras_txt)
-        colmap_images = read_images_text(images_txt)
-        colmap_images = dict(sorted(colmap_images.items(), key = lambda kv: int(kv[1].name.split('.')[0].split('_')[1]))) #sort by timestamps
-        colmap_points = read_points3D_text(points3d_txt)
+        scene_cache = SceneCache(f"{outputs_dir}/cache", max_bytes=int(args.cache_max_mb) << 20) if args.cache else None
+        with profiler.stage("load_scene", unit="points") as stage:
+            scene_key = ("scene", os.path.abspath(colmap_dir), scene_cache_key(colmap_dir))
+            colmap_scene = cached(state, scene_key, lambda: load_colmap_scene(colmap_dir, scene_cache))
+            if colmap_scene is None:
+                sys.exit(f"No COLMAP model (.bin or .txt) found in {colmap_dir}")
+            colmap_cameras, colmap_images, colmap_points, cache_entry = colmap_scene
+            if cache_entry is not None and not os.path.isdir(cache_entry):
+                cache_entry = None  # evicted from the scene cache since this warm scene was loaded
+            stage.items = len(colmap_points.xyz)
+
+        #Drop badly triangulated points and floaters
+        clean_settings = (float(args.max_reprojection_error), int(args.min_track_length), args.outlier_removal,
+                          int(args.outlier_neighbors), float(args.outlier_std_ratio), float(args.outlier_radius))
+        points_key = scene_key[1:]
+        points_entry = cache_entry
+        if clean_settings[0] > 0 or clean_settings[1] > 0 or args.outlier_removal != "none":
+            with profiler.stage("clean_points", len(colmap_points.xyz), "points"):
+                num_points = len(colmap_points.xyz)
+                colmap_points = cached(state, ("clean", *points_key, *clean_settings), lambda: clean_points(
+                    colmap_points, *clean_settings[:3], nb_neighbors=clean_settings[3], std_ratio=clean_settings[4],
+                    radius=clean_settings[5]))
+            print(f"Kept {len(colmap_points.xyz)} of {num_points} points")
+            points_key = (*points_key, *clean_settings)
+            # files derived from the cleaned points live next to the raw scene's in its cache entry
+            if cache_entry is not None:
+                points_entry = os.path.join(cache_entry, cleaning_key(*clean_settings))
+                os.makedirs(points_entry, exist_ok=True)
 
         #Load camera information
-        key = 1
         camera = colmap_cameras[1]
         width = camera.width
         height = camera.height
+        distortion = None
         if camera.model == "PINHOLE":
             fx, fy, cx, cy = camera.params
         elif camera.model == "OPENCV":
             fx, fy, cx, cy, k1, k2, p1, p2 = camera.params
+            # the numpy renderer draws a larger pinhole frame so the distorted corners are covered
+            expand = args.renderer == "numpy"
+            distortion = cached(state, ("distortion", width, height, *camera.params, expand),
+                                lambda: load_or_build_remap(width, height, fx, fy, cx, cy, k1, k2, p1, p2, cache_entry, expand))
 
         #Load poses
-        poses = []
-        for k, v in colmap_images.items():
-            tvec = v.tvec
-            qvec = v.qvec
-            pose = tq2rotmat(tvec, qvec)
-            poses.append(pose)
+        poses = Trajectory.from_image_poses(colmap_images)
+        if args.keyframe_pruning != "none":
+            with profiler.stage("prune_keyframes", len(poses), "poses"):
+                poses = prune_keyframes(poses, args.keyframe_pruning, float(args.keyframe_translation_tol),
+                                        np.radians(float(args.keyframe_rotation_tol)))
+            print(f"Kept {len(poses)} of {len(colmap_images.ids)} keyframes")
         
         #Create ply file if not supplied
         out_path = f"{outputs_dir}/pointcloud.ply"
         print("Creating ply...")
         os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        pcd = createPlyColmap(colmap_points)
-        o3d.io.write_point_cloud(out_path, pcd, write_ascii=False)
+        with profiler.stage("create_ply", len(colmap_points.xyz), "points"):
+            cloud_key = ("pcd", *points_key)
+            # the numpy renderer works on the arrays, so it never needs open3d
+            pcd = cached(state, cloud_key, lambda: createPlyColmap(colmap_points)) if args.renderer != "numpy" else None
+        # levels of detail go first so the preview finds them when pointcloud.ply changes
+        lod_budgets = [int(b) for b in args.lod_budgets.split(",") if b.strip()]
+        with profiler.stage("write_lods", len(colmap_points.xyz), "points"):
+            lod_manifest = write_scene_lods(colmap_points, outputs_dir, lod_budgets, points_entry)
+        with profiler.stage("write_preview", len(colmap_points.xyz), "points"):
+            write_scene_preview(colmap_points, outputs_dir, points_entry)
+        with profiler.stage("write_ply", len(colmap_points.xyz), "points"):
+            write_scene_ply(colmap_points, out_path, points_entry, pcd)
+        if pcd is None:
+            points, colors = colmap_points.xyz, colmap_points.rgb
+        else:
+            points, colors = np.asarray(pcd.points), np.asarray(pcd.colors)
+        render_point_budget = int(args.render_point_budget)
+        level = pick_lod(lod_manifest, render_point_budget) if 0 < render_point_budget < len(colmap_points.xyz) else None
+        if level is not None:
+            print(f"Rendering level of detail {level['file']} with {level['points']} points")
+            level_path = os.path.join(outputs_dir, level["file"])
+            cloud_key = ("pcd", level_path, os.path.getmtime(level_path))
+            if pcd is None:
+                points, colors = cached(state, cloud_key, lambda: read_ply_binary(level_path))
+            else:
+                import open3d as o3d
+                pcd = cached(state, cloud_key, lambda: o3d.io.read_point_cloud(level_path))
+                points, colors = np.asarray(pcd.points), np.asarray(pcd.colors)
+        render_far = float(args.render_far) or None
+        voxel_index = None
+        if args.renderer == "numpy" and args.frustum_culling and not args.draft:
+            # the index of the full cloud is kept with the scene, level of detail indexes only in memory
+            index_path = os.path.join(points_entry, VOXEL_INDEX_NAME) if points_entry is not None and level is None else None
+            with profiler.stage("build_index", len(points), "points"):
+                voxel_index = cached(state, ("index", *cloud_key), lambda: load_or_build_index(points, index_path))
         print("Interpolating poses...")
-        newposes = interpolate_poses(poses)
-        #Render snapshots with open3d
+        with profiler.stage("interpolate_poses", unit="poses") as stage:
+            if args.trajectory_mode == "arclength":
+                newposes = resample_poses(poses, fps, nseconds)
+            else:
+                newposes = interpolate_poses(poses)
+            stage.items = len(newposes)
+        if args.draft:
+            render_draft(args, colmap_points, lod_manifest, outputs_dir, newposes, width, height, fx, fy, cx, cy,
+                         background_colour, fps if fps is not None else max(int(len(newposes)/nseconds), 1), profiler)
+            profiler.summary()
+            return
+        #Render snapshots with open3d, streaming them into ffmpeg as they are captured
         print("Rendering frames...")
-        if os.path.exists(f"{render_folder}/image"):
-            shutil.rmtree(f"{render_folder}/image")
-        if os.path.exists(f"{render_folder}/depth"):
-            shutil.rmtree(f"{render_folder}/depth")        
-        custom_draw_geometry_with_camera_trajectory(pcd, newposes, width, height, fx, fy, cx, cy, background_colour, render_folder)
+        stream_fps = fps if fps is not None else max(int(len(newposes)/nseconds), 1)
+        manifest = FrameManifest(render_folder)
+        frame_settings = {"intrinsics": [width, height, float(fx), float(fy), float(cx), float(cy)],
+                          "background": list(background_colour), "depth": args.render_depth,
+                          "pointcloud": cached(state, ("hash", *cloud_key), lambda: array_hash(points, colors))}
+        if args.renderer != "open3d":
+            frame_settings["renderer"] = [args.renderer, int(args.point_size), render_far]
+        if distortion is not None:
+            frame_settings["distortion"] = [float(k) for k in (k1, k2, p1, p2)]
+        frame_folders = ("image", "depth") if args.render_depth else ("image",)
+        if args.incremental:
+            #Only render frames whose pose or settings changed, the video is encoded from the frames on disk
+            to_render = manifest.update(frame_keys(newposes, frame_settings), frame_folders)
+            print(f"Reusing {len(newposes) - len(to_render)} frames, rendering {len(to_render)}")
+            render_poses = newposes[to_render]
+            render_kwargs = dict(save_frames=True, render_depth=args.render_depth, frame_ids=to_render, distortion=distortion)
+        else:
+            if os.path.exists(f"{render_folder}/image"):
+                shutil.rmtree(f"{render_folder}/image")
+            if os.path.exists(f"{render_folder}/depth"):
+                shutil.rmtree(f"{render_folder}/depth")        
+            manifest.reset()
+            render_poses = newposes
+            video_path = f"{outputs_dir}/rgb.mp4" if args.stream_video else None
+            depth_video_path = f"{outputs_dir}/depth.mkv" if args.stream_video else None
+            render_kwargs = dict(save_frames=args.save_frames, video_path=video_path, fps=stream_fps,
+                                 render_depth=args.render_depth, depth_video_path=depth_video_path, distortion=distortion)
+        if len(render_poses) == 0:
+            print("All frames are up to date")
+        else:
+            with profiler.stage("render_frames", len(render_poses), "frames"):
+                if args.renderer == "numpy":
+                    render_trajectory_splat(points, colors, render_poses, width, height, fx, fy, cx, cy,
+                                            background_colour, render_folder, int(args.point_size), far=render_far,
+                                            voxel_index=voxel_index, **render_kwargs)
+                elif render_workers > 1:
+                    render_trajectory_parallel(pcd, render_poses, width, height, fx, fy, cx, cy, background_colour, render_folder, render_workers,
+                                               pool_cache=state.render_pool if state is not None else None, **render_kwargs)
+                else:
+                    custom_draw_geometry_with_camera_trajectory(pcd, render_poses, width, height, fx, fy, cx, cy, background_colour, render_folder, **render_kwargs)
+        if args.incremental:
+            manifest.commit()
+            if args.stream_video:
+                encode_stale_frames(manifest, outputs_dir, stream_fps, args.render_depth, profiler)
+        elif args.save_frames:
+            manifest.reset(frame_keys(newposes, frame_settings))
+            if args.stream_video:
+                manifest.encoded({"fps": stream_fps, "depth": args.render_depth})
 
         #Debug visualiser
         # visualise_debugger(newposes, poses)
@@ -312,50 +950,28 @@ if __name__ == "__main__":
         n_poses = len(newposes)
         with open(poses_txt, 'w') as file:
             file.write(f'{n_poses}')
+        newposes.save(f'{outputs_dir}/trajectory.npy')
 
     #Render video
     if render_rgb:
-        base = os.path.abspath(render_folder)
-        img_seq = os.path.join(base, "image", "%05d.png")
-        depth_seq = os.path.join(base, "depth", "%05d.png")
         os.makedirs(f"{outputs_dir}", exist_ok=True)
 
         with open(poses_txt, 'r') as file:
             n_poses = int(file.readline())
-        fps = int(n_poses/nseconds)
+        if fps is None:
+            fps = max(int(n_poses/nseconds), 1)
         print(f'Number of poses: {n_poses}, Frame rate: {fps}')
 
-        if os.path.exists(f"{outputs_dir}/rgb.mp4"):
-            os.remove(f"{outputs_dir}/rgb.mp4")
-
-        ffmpeg_exe = get_ffmpeg_exe()
-        
-        cmd = [
-            ffmpeg_exe,
-            '-framerate', str(fps),
-            '-i', os.path.join(render_folder, 'image', '%05d.png'),
-            '-pix_fmt', 'yuv420p',
-            f'{outputs_dir}/rgb.mp4'
-        ]
-        print("Running ffmpeg")
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
-
-        # parse to stdout
-        for line in proc.stdout:
-            line = line.strip()
-            if line:
-                if '=' in line:
-                    k, v = line.split('=', 1)
-                    print(f'FFMPEG:{k}={v}', flush=True)
-                else:
-                    print(line, flush=True)
+    frames_on_disk = os.path.exists(os.path.join(render_folder, 'image', '00000.png'))
+    if render_rgb and not frames_on_disk:
+        if not os.path.exists(f"{outputs_dir}/rgb.mp4"):
+            sys.exit("No frames found to encode. Run --generate_frames with --save_frames or --stream_video first")
+        print("rgb.mp4 was already encoded while generating frames")
 
-        # capture final stderr if any
-        err = proc.stderr.read()
-        if err:
-            print('FFMPEG_ERR:' + err, flush=True)
+    if render_rgb and frames_on_disk:
+        encode_stale_frames(FrameManifest(render_folder), outputs_dir, fps, args.render_depth, profiler)
 
-        proc.wait()
+    profiler.summary()
 
     # ######
     # qvecs = [rotmat2qvec(pose[:3,:3]) for pose in poses]
@@ -376,4 +992,18 @@ if __name__ == "__main__":
     # newt = catmul_romm(tvecs[50], tvecs[51], tvecs[52], tvecs[53])
     # # newposes = [poses[50], poses[51], tq2rotmat(newt, newq), poses[52], poses[53]]
     # newposes = [poses[50], poses[51], tq2rotmat(newt, newq_a), poses[52], poses[53]]
-    # visualise_debugger(newposes, poses[50:54])
\ No newline at end of file
+    # visualise_debugger(newposes, poses[50:54])
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    args = build_parser().parse_args()
+    if args.serve:
+        # responses and logs must reach main.js as soon as they are printed
+        sys.stdout.reconfigure(line_buffering=True)
+        state = BackendState()
+        try:
+            serve(service_methods(state))
+        finally:
+            state.close()
+    else:
+        run(args)
@@ -0,0 +1,82 @@
+"""Measures the startup import cost of every backend subcommand with python -X importtime.
+
+Fails (exit code 1) when a subcommand exceeds its time budget or imports one of the
+heavy modules it should not need, so regressions in the lazy imports of app.py are
+caught before a release.
+
+Example:
+    python backend/benchmarks/import_time.py --output import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(BACKEND_DIR, "app.py")
+
+# Modules only the stages that really need them may load
+HEAVY_MODULES = ("open3d", "scipy", "vedo", "transforms3d", "tqdm")
+
+
+def parse_importtime(stderr):
+    """Parses -X importtime output into {module: (self_us, cumulative_us, depth)} and the top-level total in ms"""
+    modules = {}
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # nested imports are indented by two spaces per level
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+        if depth == 0:
+            total_us += int(cumulative_us)
+    return modules, total_us / 1000.0
+
+
+def measure(command, repeat=3):
+    """Imports app.py the way `app.py <command> --help` does and returns the fastest run"""
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", APP, command, "--help"],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, cwd=BACKEND_DIR)
+        if proc.returncode != 0:
+            raise RuntimeError(f"app.py {command} --help failed:\n{proc.stderr[-2000:]}")
+        modules, total_ms = parse_importtime(proc.stderr)
+        if best is None or total_ms < best[1]:
+            best = (modules, total_ms)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the import time of the backend subcommands")
+    parser.add_argument("--commands", default="render,serve,generate", help="Comma separated subcommands to measure")
+    parser.add_argument("--max_ms", default="1500", help="Import time budget of each subcommand (ms)")
+    parser.add_argument("--repeat", default="3", help="Runs per subcommand, the fastest is reported")
+    parser.add_argument("--top", default="10", help="Number of slowest top-level imports to list")
+    parser.add_argument("--output", default="", help="Writes the results to this JSON file")
+    args = parser.parse_args()
+
+    results, failures = [], []
+    for command in args.commands.split(","):
+        modules, total_ms = measure(command, int(args.repeat))
+        heavy = sorted({name.split(".")[0] for name in modules} & set(HEAVY_MODULES))
+        slowest = sorted(((name, cumulative / 1000.0) for name, (_, cumulative, depth) in modules.items() if depth == 0),
+                         key=lambda item: -item[1])[:int(args.top)]
+        results.append({"command": command, "total_ms": total_ms, "heavy_modules": heavy,
+                        "slowest": [{"module": name, "cumulative_ms": ms} for name, ms in slowest]})
+        print(f"app.py {command}: {total_ms:.1f} ms")
+        for name, ms in slowest:
+            print(f"  {ms:8.1f} ms  {name}")
+        if total_ms > float(args.max_ms):
+            failures.append(f"{command} imports take {total_ms:.1f} ms (budget {args.max_ms} ms)")
+        if heavy:
+            failures.append(f"{command} imports {', '.join(heavy)} at startup")
+
+    if args.output:
+        with open(args.output, "w") as fid:
+            json.dump({"max_ms": float(args.max_ms), "commands": results, "failures": failures}, fid, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,278 @@
+"""Times every backend stage on a synthetic COLMAP scene and reports throughput and peak memory.
+
+Example:
+    python backend/benchmarks/run_benchmarks.py --points 1000000 --images 500 --output bench.json
+    python backend/benchmarks/run_benchmarks.py --points 1000000 --images 500 --baseline bench.json
+
+Stages that need open3d (point cloud creation, open3d rendering) are reported as
+skipped when it cannot be imported or no display is available.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from synthetic_scene import generate_scene  # noqa: E402
+from utils import read_write_colmap_model as colmap  # noqa: E402
+from utils.ffmpeg_stream import FFmpegRawVideoWriter  # noqa: E402
+from utils.pose_interpolation import interpolate_trajectory, prune_keyframes  # noqa: E402
+from utils.profiling import peak_rss_mb  # noqa: E402
+from utils.trajectory import Trajectory  # noqa: E402
+from utils.voxel_index import VoxelGridIndex  # noqa: E402
+from utils.distortion import DistortionRemap, distortion_maps  # noqa: E402
+from utils.outlier_removal import clean_points  # noqa: E402
+
+RESULTS_VERSION = 1
+
+
+class SkipStage(Exception):
+    pass
+
+
+def import_app(open3d=False):
+    """Imports backend/app.py, raising SkipStage when it cannot be imported.
+
+    app.py imports open3d lazily, inside the functions using it, so stages calling
+    those functions pass open3d=True to check it is installed up front.
+    """
+    if open3d:
+        try:
+            import open3d  # noqa: F401
+        except Exception as e:
+            raise SkipStage(f"open3d cannot be imported: {e!r}")
+    try:
+        import app
+    except Exception as e:
+        raise SkipStage(f"app.py cannot be imported: {e!r}")
+    return app
+
+
+def measure(name, fn, items, unit, repeat=1):
+    """Records the best wall time of repeat runs, its cpu time and items/s.
+
+    The peak allocation is traced in one extra run, as tracemalloc slows down
+    allocation-heavy Python code too much to time it at the same time.
+    """
+    result = {"stage": name, "items": items, "unit": unit}
+    try:
+        best = None
+        for _ in range(repeat):
+            gc.collect()
+            wall, cpu = time.perf_counter(), time.process_time()
+            fn()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if best is None or wall < best[0]:
+                best = (wall, cpu)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    except SkipStage as e:
+        result["skipped"] = str(e)
+        print(f"{name:<28} skipped: {e}")
+        return result
+    wall, cpu = best
+    result.update({
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "throughput": items / wall if wall > 0 else None,
+        "peak_alloc_mb": peak / (1 << 20),
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    print(f"{name:<28} {wall:9.3f} s {items / max(wall, 1e-9):14.1f} {unit}/s {result['peak_alloc_mb']:9.1f} MB")
+    return result
+
+
+def poses_from_scene(scene_dir):
+    _, images, _ = colmap.read_model_arrays(scene_dir, ext=".bin", poses_only=True)
+    return Trajectory.from_image_poses(images)
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pcd-bench-")
+    scene_dir = os.path.join(workdir, "scene")
+    num_points, num_images = int(args.points), int(args.images)
+    print(f"Generating synthetic scene in {scene_dir}")
+    scene = generate_scene(scene_dir, num_points, num_images, int(args.track_length), float(args.keyframe_spacing),
+                           width=int(args.width), height=int(args.height), seed=int(args.seed))
+    stages = set(args.stages.split(",")) if args.stages else None
+    repeat = int(args.repeat)
+    results = []
+
+    def stage(name, fn, items, unit):
+        if stages is None or name in stages:
+            results.append(measure(name, fn, items, unit, repeat))
+
+    for ext, suffix in ((".txt", "text"), (".bin", "binary")):
+        points_path = os.path.join(scene_dir, "points3D" + ext)
+        images_path = os.path.join(scene_dir, "images" + ext)
+        cameras_path = os.path.join(scene_dir, "cameras" + ext)
+        reader = getattr(colmap, f"read_points3D_{suffix}")
+        array_reader = getattr(colmap, f"read_points3D_{suffix}_arrays")
+        stage(f"read_cameras_{suffix}", lambda: getattr(colmap, f"read_cameras_{suffix}")(cameras_path), 1, "files")
+        stage(f"read_images_{suffix}", lambda: getattr(colmap, f"read_images_{suffix}")(images_path), num_images, "images")
+        stage(f"read_images_{suffix}_poses", lambda: getattr(colmap, f"read_images_{suffix}_poses")(images_path), num_images, "images")
+        stage(f"read_points3D_{suffix}", lambda: reader(points_path), num_points, "points")
+        stage(f"read_points3D_{suffix}_arrays", lambda: array_reader(points_path), num_points, "points")
+
+    points = colmap.read_points3D_binary_arrays(os.path.join(scene_dir, "points3D.bin"))
+    ply_path = os.path.join(workdir, "pointcloud.ply")
+    stage("clean_points_statistical", lambda: clean_points(points, max_error=2.0, min_track_length=3, method="statistical"),
+          num_points, "points")
+    stage("clean_points_radius", lambda: clean_points(points, method="radius", nb_neighbors=4, radius=0.05), num_points, "points")
+
+    def create_ply():
+        app = import_app(open3d=True)
+        pcd = app.createPlyColmap(points)
+        app.write_scene_ply(points, ply_path, pcd=pcd)
+
+    stage("create_ply", create_ply, num_points, "points")
+
+    poses = poses_from_scene(scene_dir)
+    threshold = float(args.threshold)
+    interpolated = interpolate_trajectory(poses, threshold)
+
+    def interpolate():
+        try:
+            app = import_app()
+        except SkipStage:
+            # interpolate_poses is a thin wrapper around interpolate_trajectory
+            interpolate_trajectory(poses, threshold)
+        else:
+            app.interpolate_poses(poses, threshold)
+
+    stage("interpolate_poses", interpolate, len(interpolated), "poses")
+    stage("prune_keyframes_tolerance", lambda: prune_keyframes(poses, "tolerance"), len(poses), "poses")
+    stage("prune_keyframes_douglas_peucker", lambda: prune_keyframes(poses, "douglas_peucker"), len(poses), "poses")
+
+    num_frames = min(int(args.frames), len(interpolated))
+    width, height = int(args.width), int(args.height)
+    render_poses = interpolated[:num_frames]
+
+    def render():
+        app = import_app(open3d=True)
+        if not os.environ.get("DISPLAY") and sys.platform.startswith("linux"):
+            raise SkipStage("no display for the open3d visualiser")
+        fx, fy, cx, cy = 0.8 * width, 0.8 * width, width / 2 - 0.5, height / 2 - 0.5
+        pcd = app.createPlyColmap(points)
+        render_folder = os.path.join(workdir, "renders")
+        app.custom_draw_geometry_with_camera_trajectory(pcd, render_poses, width, height, fx, fy, cx, cy,
+                                                        [0, 0, 0], render_folder, save_frames=False)
+
+    stage("render_frames", render, num_frames, "frames")
+
+    stage("build_voxel_index", lambda: VoxelGridIndex.build(points.xyz), num_points, "points")
+    voxel_index = VoxelGridIndex.build(points.xyz)
+
+    def render_numpy(index=None):
+        app = import_app()
+        fx, fy, cx, cy = 0.8 * width, 0.8 * width, width / 2 - 0.5, height / 2 - 0.5
+        render_folder = os.path.join(workdir, "renders_numpy")
+        app.render_trajectory_splat(points.xyz, points.rgb, render_poses, width, height, fx, fy, cx, cy,
+                                    [0, 0, 0], render_folder, save_frames=False, voxel_index=index)
+
+    stage("render_frames_numpy", render_numpy, num_frames, "frames")
+    stage("render_frames_numpy_culled", lambda: render_numpy(voxel_index), num_frames, "frames")
+
+    rng = np.random.default_rng(int(args.seed))
+    frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+    # lens of a typical action camera
+    remap = DistortionRemap(*distortion_maps(width, height, 0.8 * width, 0.8 * width, width / 2, height / 2,
+                                             -0.2, 0.05, 0.001, 0.0), expand=True)
+    source = rng.integers(0, 256, size=(remap.source_size[1], remap.source_size[0], 3), dtype=np.uint8)
+
+    def distort():
+        for _ in range(num_frames):
+            remap.apply(source)
+
+    stage("distortion_remap", distort, num_frames, "frames")
+
+    def encode():
+        with FFmpegRawVideoWriter(os.path.join(workdir, "rgb.mp4"), 30) as writer:
+            for i in range(num_frames):
+                writer.write(np.roll(frame, 8 * i, axis=1))
+
+    stage("ffmpeg_encode", encode, num_frames, "frames")
+
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "numpy": np.__version__, "cpus": os.cpu_count()},
+        "scene": scene,
+        "frames": num_frames,
+        "repeat": repeat,
+        "stages": results,
+    }
+
+
+def compare(results, baseline, tolerance, min_wall=0.01):
+    """Prints the wall time of every stage against the baseline and returns the stages slower by more than tolerance.
+
+    Stages faster than min_wall seconds in the baseline are too noisy to flag.
+    """
+    base_stages = {s["stage"]: s for s in baseline["stages"] if "wall_s" in s}
+    if baseline.get("scene") != results["scene"]:
+        print("Warning: the baseline was recorded on a different scene, ratios are not comparable")
+    regressions = []
+    print(f"\n{'stage':<28} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for s in results["stages"]:
+        base = base_stages.get(s["stage"])
+        if base is None or "wall_s" not in s:
+            continue
+        ratio = s["wall_s"] / base["wall_s"] if base["wall_s"] > 0 else float("inf")
+        flag = ""
+        if ratio > 1.0 + tolerance and base["wall_s"] >= min_wall:
+            flag = "  REGRESSION"
+            regressions.append({"stage": s["stage"], "ratio": ratio})
+        print(f"{s['stage']:<28} {base['wall_s']:10.3f} {s['wall_s']:10.3f} {ratio:7.2f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the backend stages on a synthetic COLMAP scene")
+    parser.add_argument("--points", default="200000", help="Number of 3D points in the synthetic scene")
+    parser.add_argument("--images", default="300", help="Number of keyframes in the synthetic scene")
+    parser.add_argument("--track_length", default="4", help="Mean track length of the points")
+    parser.add_argument("--keyframe_spacing", default="0.3", help="Distance between keyframes (m)")
+    parser.add_argument("--threshold", default="0.05", help="Gap threshold passed to interpolate_poses (m)")
+    parser.add_argument("--frames", default="120", help="Number of frames to render and encode")
+    parser.add_argument("--width", default="1280", help="Frame width")
+    parser.add_argument("--height", default="720", help="Frame height")
+    parser.add_argument("--repeat", default="1", help="Runs per stage, the fastest is reported")
+    parser.add_argument("--stages", default="", help="Comma separated stages to run (default: all)")
+    parser.add_argument("--seed", default="0", help="Random seed of the synthetic scene")
+    parser.add_argument("--workdir", default="", help="Keeps the scene and outputs here instead of a temporary directory")
+    parser.add_argument("--output", default="", help="Writes the results to this JSON file")
+    parser.add_argument("--baseline", default="", help="Compares against results stored by an earlier --output run")
+    parser.add_argument("--tolerance", default="0.2", help="Relative slowdown against the baseline reported as a regression")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.baseline:
+        with open(args.baseline) as fid:
+            baseline = json.load(fid)
+        results["regressions"] = compare(results, baseline, float(args.tolerance))
+    if args.output:
+        with open(args.output, "w") as fid:
+            json.dump(results, fid, indent=2)
+        print(f"Results written to {args.output}")
+    if results.get("regressions"):
+        sys.exit(1)
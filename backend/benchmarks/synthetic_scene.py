@@ -0,0 +1,168 @@
+"""Synthetic COLMAP scenes of configurable size for the backend benchmarks.
+
+Example:
+    python backend/benchmarks/synthetic_scene.py --out_dir /tmp/scene --points 1000000 --images 500
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.read_write_colmap_model import (  # noqa: E402
+    Camera, POINT3D_BINARY_HEAD_DTYPE, rotmat2qvec, write_cameras_binary, write_cameras_text,
+)
+
+MODEL_FORMATS = (".txt", ".bin")
+
+
+def camera_path(num_images, keyframe_spacing, rng):
+    """Smooth walkthrough: (N,4) w x y z world-to-camera quaternions and (N,3) translations"""
+    s = np.arange(num_images) * keyframe_spacing
+    centres = np.stack([s, 2.0 * np.sin(s / 7.0), 0.3 * np.cos(s / 5.0)], axis=1)
+    centres += rng.normal(scale=0.01 * keyframe_spacing, size=centres.shape)
+    heading = np.gradient(centres, axis=0)
+    heading /= np.linalg.norm(heading, axis=1, keepdims=True)
+    qvecs = np.empty((num_images, 4))
+    tvecs = np.empty((num_images, 3))
+    up = np.array([0.0, 0.0, 1.0])
+    for i in range(num_images):
+        z = heading[i]
+        x = np.cross(z, up)
+        x /= np.linalg.norm(x)
+        y = np.cross(z, x)
+        R = np.stack([x, y, z])  # rows are camera axes in world frame: world-to-camera rotation
+        qvecs[i] = rotmat2qvec(R)
+        tvecs[i] = -R @ centres[i]
+    return qvecs, tvecs, centres
+
+
+def generate_scene(out_dir, num_points=100000, num_images=200, track_length=4, keyframe_spacing=0.3,
+                   track_jitter=2, width=1920, height=1080, formats=(".txt", ".bin"), seed=0, distortion=None):
+    """Writes cameras, images and points3D in every format of formats to out_dir and returns a summary dict.
+
+    With distortion, a (k1, k2, p1, p2) tuple, the camera is an OPENCV camera instead of a PINHOLE one.
+    """
+    unknown = [ext for ext in formats if ext not in MODEL_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown model formats {unknown}, expected some of {MODEL_FORMATS}")
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    params = [0.8 * width, 0.8 * width, width / 2, height / 2]
+    cameras = {1: Camera(id=1, model="OPENCV" if distortion else "PINHOLE", width=width, height=height,
+                         params=np.array(params + list(distortion or [])))}
+    qvecs, tvecs, centres = camera_path(num_images, keyframe_spacing, rng)
+
+    # points scattered in a corridor around the path
+    anchor = rng.integers(0, num_images, num_points)
+    xyz = centres[anchor] + rng.normal(scale=[1.0, 2.5, 1.5], size=(num_points, 3))
+    rgb = rng.integers(0, 256, size=(num_points, 3), dtype=np.uint8)
+    error = rng.gamma(2.0, 0.5, num_points)
+    ids = np.arange(1, num_points + 1, dtype=np.uint64)
+
+    # tracks: images near each point's anchor, point2D_idx is the running index within the image
+    lengths = np.clip(track_length + rng.integers(-track_jitter, track_jitter + 1, num_points), 2, None)
+    track_offsets = np.concatenate([[0], np.cumsum(lengths)])
+    owner = np.repeat(np.arange(num_points), lengths)
+    image_idx = np.clip(anchor[owner] + rng.integers(-5, 6, len(owner)), 0, num_images - 1)
+    order = np.argsort(image_idx, kind="stable")
+    per_image = np.bincount(image_idx, minlength=num_images)
+    image_starts = np.concatenate([[0], np.cumsum(per_image)])
+    point2D_idxs = np.empty(len(owner), dtype=np.int64)
+    point2D_idxs[order] = np.arange(len(owner)) - np.repeat(image_starts[:-1], per_image)
+    image_ids = image_idx + 1
+    xys = rng.uniform([0, 0], [width, height], size=(len(owner), 2))
+
+    for ext in formats:
+        if ext == ".txt":
+            write_cameras_text(cameras, os.path.join(out_dir, "cameras.txt"))
+            _write_images_text(os.path.join(out_dir, "images.txt"), qvecs, tvecs, order, image_starts, xys, ids[owner])
+            _write_points_text(os.path.join(out_dir, "points3D.txt"), ids, xyz, rgb, error, track_offsets, image_ids, point2D_idxs)
+        else:
+            write_cameras_binary(cameras, os.path.join(out_dir, "cameras.bin"))
+            _write_images_binary(os.path.join(out_dir, "images.bin"), qvecs, tvecs, order, image_starts, xys, ids[owner])
+            _write_points_binary(os.path.join(out_dir, "points3D.bin"), ids, xyz, rgb, error, lengths, image_ids, point2D_idxs)
+
+    return {"points": num_points, "images": num_images, "observations": int(len(owner)),
+            "mean_track_length": float(lengths.mean()), "keyframe_spacing": keyframe_spacing,
+            "width": width, "height": height}
+
+
+def _image_name(i):
+    return f"frame_{i + 1:06d}.png"
+
+
+def _write_images_text(path, qvecs, tvecs, order, image_starts, xys, point3D_ids):
+    with open(path, "w") as fid:
+        fid.write("# Image list with two lines of data per image:\n")
+        fid.write("#   IMAGE_ID, QW, QX, QY, QZ, TX, TY, TZ, CAMERA_ID, NAME\n")
+        fid.write("#   POINTS2D[] as (X, Y, POINT3D_ID)\n")
+        for i in range(len(qvecs)):
+            fid.write(" ".join(map(str, [i + 1, *qvecs[i], *tvecs[i], 1, _image_name(i)])) + "\n")
+            obs = order[image_starts[i]:image_starts[i + 1]]
+            fid.write(" ".join(f"{x:.2f} {y:.2f} {p}" for (x, y), p in zip(xys[obs], point3D_ids[obs])) + "\n")
+
+
+def _write_images_binary(path, qvecs, tvecs, order, image_starts, xys, point3D_ids):
+    obs_dtype = np.dtype([("x", "<f8"), ("y", "<f8"), ("id", "<i8")])
+    with open(path, "wb") as fid:
+        fid.write(np.uint64(len(qvecs)).tobytes())
+        for i in range(len(qvecs)):
+            head = np.zeros(1, dtype=[("id", "<i4"), ("q", "<f8", 4), ("t", "<f8", 3), ("camera_id", "<i4")])
+            head["id"], head["q"], head["t"], head["camera_id"] = i + 1, qvecs[i], tvecs[i], 1
+            fid.write(head.tobytes())
+            fid.write(_image_name(i).encode("utf-8") + b"\x00")
+            obs = order[image_starts[i]:image_starts[i + 1]]
+            fid.write(np.uint64(len(obs)).tobytes())
+            records = np.empty(len(obs), dtype=obs_dtype)
+            records["x"], records["y"], records["id"] = xys[obs, 0], xys[obs, 1], point3D_ids[obs]
+            fid.write(records.tobytes())
+
+
+def _write_points_text(path, ids, xyz, rgb, error, track_offsets, image_ids, point2D_idxs):
+    with open(path, "w") as fid:
+        fid.write("# 3D point list with one line of data per point:\n")
+        fid.write("#   POINT3D_ID, X, Y, Z, R, G, B, ERROR, TRACK[] as (IMAGE_ID, POINT2D_IDX)\n")
+        for i in range(len(ids)):
+            track = np.stack([image_ids[track_offsets[i]:track_offsets[i + 1]],
+                              point2D_idxs[track_offsets[i]:track_offsets[i + 1]]], axis=1).ravel()
+            fid.write(f"{ids[i]} {xyz[i, 0]} {xyz[i, 1]} {xyz[i, 2]} {rgb[i, 0]} {rgb[i, 1]} {rgb[i, 2]} {error[i]} "
+                      + " ".join(map(str, track)) + "\n")
+
+
+def _write_points_binary(path, ids, xyz, rgb, error, lengths, image_ids, point2D_idxs):
+    head_size = POINT3D_BINARY_HEAD_DTYPE.itemsize + 8
+    heads = np.empty(len(ids), dtype=POINT3D_BINARY_HEAD_DTYPE.descr + [("track_length", "<u8")])
+    heads["id"], heads["xyz"], heads["rgb"], heads["error"], heads["track_length"] = ids, xyz, rgb, error, lengths
+    record_sizes = head_size + 8 * lengths
+    offsets = 8 + np.concatenate([[0], np.cumsum(record_sizes)[:-1]])
+    out = np.empty(8 + int(record_sizes.sum()), dtype=np.uint8)
+    out[:8] = np.frombuffer(np.uint64(len(ids)).tobytes(), dtype=np.uint8)
+    out[offsets[:, None] + np.arange(head_size)] = heads.view(np.uint8).reshape(len(ids), head_size)
+    track = np.stack([image_ids, point2D_idxs], axis=1).astype("<i4")
+    starts = np.repeat(offsets + head_size, lengths) + 8 * (np.arange(len(track)) - np.repeat(np.cumsum(lengths) - lengths, lengths))
+    out[starts[:, None] + np.arange(8)] = track.view(np.uint8).reshape(len(track), 8)
+    out.tofile(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Writes a synthetic COLMAP scene")
+    parser.add_argument("--out_dir", required=True, help="Directory to write the model files to")
+    parser.add_argument("--points", default="100000", help="Number of 3D points")
+    parser.add_argument("--images", default="200", help="Number of registered images (keyframes)")
+    parser.add_argument("--track_length", default="4", help="Mean track length")
+    parser.add_argument("--keyframe_spacing", default="0.3", help="Distance between keyframes (m)")
+    parser.add_argument("--formats", default=".txt,.bin", help="Comma separated model formats to write (.txt, .bin)")
+    parser.add_argument("--seed", default="0", help="Random seed")
+    parser.add_argument("--distortion", default="", help="Comma separated k1,k2,p1,p2 of an OPENCV camera (PINHOLE when empty)")
+    args = parser.parse_args()
+    formats = ["." + ext.strip().lstrip(".") for ext in args.formats.split(",") if ext.strip()]
+    unknown = [ext for ext in formats if ext not in MODEL_FORMATS]
+    if unknown or not formats:
+        parser.error(f"--formats: expected a comma separated list of {', '.join(MODEL_FORMATS)}, got {args.formats!r}")
+    distortion = [float(k) for k in args.distortion.split(",")] if args.distortion else None
+    summary = generate_scene(args.out_dir, int(args.points), int(args.images), int(args.track_length),
+                             float(args.keyframe_spacing), formats=formats, seed=int(args.seed),
+                             distortion=distortion)
+    print(summary)
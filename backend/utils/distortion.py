@@ -0,0 +1,134 @@
+import hashlib
+import os
+
+import numpy as np
+
+from .scene_cache import replacing
+
+
+def distort_normalized(x, y, k1, k2, p1, p2):
+    """Applies the COLMAP OPENCV lens model (radial k1, k2 and tangential p1, p2) to normalised image coordinates"""
+    xy = x * y
+    r2 = x * x + y * y
+    radial = 1 + k1 * r2 + k2 * r2 * r2
+    return x * radial + 2 * p1 * xy + p2 * (r2 + 2 * x * x), y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * xy
+
+
+def undistort_normalized(xd, yd, k1, k2, p1, p2, iterations=20):
+    """Inverts distort_normalized by fixed-point iteration, like cv2.undistortPoints"""
+    x, y = xd.copy(), yd.copy()
+    for _ in range(iterations):
+        xy = x * y
+        r2 = x * x + y * y
+        radial = 1 + k1 * r2 + k2 * r2 * r2
+        x = (xd - 2 * p1 * xy - p2 * (r2 + 2 * x * x)) / radial
+        y = (yd - p1 * (r2 + 2 * y * y) - 2 * p2 * xy) / radial
+    return x, y
+
+
+def distortion_maps(width, height, fx, fy, cx, cy, k1, k2, p1, p2):
+    """(H,W) float32 map_x, map_y: the pixel of the undistorted pinhole image seen by every pixel of the distorted image.
+
+    This is the lookup table of cv2.initUndistortRectifyMap run the other way round:
+    the renderers produce pinhole frames, the output follows the source lens.
+    """
+    u, v = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+    # COLMAP places the centre of pixel (0, 0) at (0.5, 0.5)
+    x, y = undistort_normalized((u + 0.5 - cx) / fx, (v + 0.5 - cy) / fy, k1, k2, p1, p2)
+    return (fx * x + cx - 0.5).astype(np.float32), (fy * y + cy - 0.5).astype(np.float32)
+
+
+class DistortionRemap:
+    """Resamples rendered pinhole frames to the distorted camera with precomputed gather indices and weights.
+
+    map_x and map_y come from distortion_maps. With expand, the pinhole frame to render
+    (source_size, rendered with the principal point moved by source_offset) grows to
+    cover every pixel the distorted camera sees, up to max_scale times the output
+    size; otherwise it keeps the output size and pixels looking outside it get fill.
+    Colours are interpolated bilinearly (in 8-bit fixed point for uint8 frames);
+    depth uses the nearest pixel, so foreground and background depths never blend.
+    """
+
+    def __init__(self, map_x, map_y, params=None, expand=False, max_scale=2.0):
+        self.params = params
+        self.shape = map_x.shape
+        height, width = self.shape
+        offset_x = offset_y = 0
+        source_width, source_height = width, height
+        if expand:
+            margin_x, margin_y = (max_scale - 1) * width / 2, (max_scale - 1) * height / 2
+            offset_x = int(np.clip(np.floor(map_x.min()), -margin_x, 0))
+            offset_y = int(np.clip(np.floor(map_y.min()), -margin_y, 0))
+            source_width = int(np.clip(np.ceil(map_x.max()) + 1, width, width + margin_x)) - offset_x
+            source_height = int(np.clip(np.ceil(map_y.max()) + 1, height, height + margin_y)) - offset_y
+            map_x, map_y = map_x - offset_x, map_y - offset_y
+        # shift of the source frame: render it with cx - offset_x, cy - offset_y
+        self.source_offset = (offset_x, offset_y)
+        self.source_size = (source_width, source_height)
+        x0, y0 = np.floor(map_x), np.floor(map_y)
+        wx, wy = (map_x - x0).ravel(), (map_y - y0).ravel()
+        x0, y0 = x0.astype(np.intp).ravel(), y0.astype(np.intp).ravel()
+        self.valid = ((map_x >= -0.5) & (map_x <= source_width - 0.5) & (map_y >= -0.5) & (map_y <= source_height - 0.5)).ravel()
+        # corners outside the frame repeat the edge pixel
+        xs = np.clip(np.stack([x0, x0 + 1]), 0, source_width - 1)
+        ys = np.clip(np.stack([y0, y0 + 1]), 0, source_height - 1)
+        self.corners = np.stack([ys[0] * source_width + xs[0], ys[0] * source_width + xs[1],
+                                 ys[1] * source_width + xs[0], ys[1] * source_width + xs[1]])
+        self.weights = np.stack([(1 - wx) * (1 - wy), wx * (1 - wy), (1 - wx) * wy, wx * wy]).astype(np.float32)
+        # 8-bit fixed point weights summing to exactly 256
+        self.weights_u16 = np.round(self.weights * 256).astype(np.uint16)
+        self.weights_u16[3] = 256 - self.weights_u16[:3].sum(axis=0)
+        nearest_x = np.clip(np.round(map_x.ravel()), 0, source_width - 1).astype(np.intp)
+        nearest_y = np.clip(np.round(map_y.ravel()), 0, source_height - 1).astype(np.intp)
+        self.nearest = nearest_y * source_width + nearest_x
+
+    def source_intrinsics(self, fx, fy, cx, cy):
+        """(width, height, fx, fy, cx, cy) of the pinhole frame to render before apply"""
+        return (*self.source_size, fx, fy, cx - self.source_offset[0], cy - self.source_offset[1])
+
+    def apply(self, images, nearest=False, fill=0):
+        """Remaps an (h,w) or (h,w,C) source frame, or a batch (N,h,w[,C]) of them at once, to the output size"""
+        images = np.asarray(images)
+        source_shape = self.source_size[::-1]
+        batched = images.shape[:2] != source_shape
+        if batched and images.shape[1:3] != source_shape:
+            raise ValueError(f"Expected frames of {self.source_size[0]}x{self.source_size[1]} pixels, got an array of shape {images.shape}")
+        lead = images.shape[:1] if batched else ()
+        tail = images.shape[len(lead) + 2:]
+        axis = len(lead)
+        flat = images.reshape(*lead, -1, *tail)
+        expand = (slice(None),) + (None,) * len(tail)
+        if nearest:
+            out = np.take(flat, self.nearest, axis=axis)
+        elif images.dtype == np.uint8:
+            out = np.take(flat, self.corners[0], axis=axis) * self.weights_u16[0][expand]
+            for corner, weight in zip(self.corners[1:], self.weights_u16[1:]):
+                out += np.take(flat, corner, axis=axis) * weight[expand]
+            out = ((out + 128) >> 8).astype(np.uint8)
+        else:
+            out = np.take(flat, self.corners[0], axis=axis) * self.weights[0][expand]
+            for corner, weight in zip(self.corners[1:], self.weights[1:]):
+                out += np.take(flat, corner, axis=axis) * weight[expand]
+            out = out.astype(images.dtype)
+        out[(slice(None),) * axis + (~self.valid,)] = fill
+        return out.reshape(*lead, *self.shape, *tail)
+
+
+def distortion_key(width, height, fx, fy, cx, cy, k1, k2, p1, p2):
+    params = [int(width), int(height), *(float(p) for p in (fx, fy, cx, cy, k1, k2, p1, p2))]
+    return hashlib.sha1(repr(params).encode()).hexdigest()[:16]
+
+
+def load_or_build_remap(width, height, fx, fy, cx, cy, k1, k2, p1, p2, cache_dir=None, expand=False):
+    """DistortionRemap of an OPENCV camera, with its maps read from (or saved to) distortion_<key>.npz in cache_dir"""
+    key = distortion_key(width, height, fx, fy, cx, cy, k1, k2, p1, p2)
+    path = os.path.join(cache_dir, f"distortion_{key}.npz") if cache_dir else None
+    if path and os.path.exists(path):
+        with np.load(path) as data:
+            map_x, map_y = data["map_x"], data["map_y"]
+    else:
+        map_x, map_y = distortion_maps(width, height, fx, fy, cx, cy, k1, k2, p1, p2)
+        if path:
+            with replacing(path) as tmp:
+                np.savez(tmp, map_x=map_x, map_y=map_y)
+    return DistortionRemap(map_x, map_y, params=(key, expand), expand=expand)
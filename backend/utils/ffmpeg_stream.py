@@ -0,0 +1,145 @@
+import os
+import subprocess
+import tempfile
+import threading
+from collections import deque
+
+import numpy as np
+from imageio_ffmpeg import get_ffmpeg_exe
+
+
+def float_to_rgb24(buffer):
+    """Converts an open3d float colour buffer (H,W,3) in [0, 1] to uint8 rgb24"""
+    return (np.clip(np.asarray(buffer), 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+
+
+def depth_to_gray16(buffer, depth_scale=1000.0):
+    """Converts an open3d float depth buffer (H,W) in metres to little-endian uint16 (millimetres by default)"""
+    depth = np.asarray(buffer, dtype=np.float64) * depth_scale + 0.5
+    return np.clip(depth, 0, 65535).astype('<u2')
+
+
+def drain_lines(stream, tail):
+    """Reads a pipe until EOF, keeping its last lines in the deque tail. Run on a thread so the pipe never fills up"""
+    for line in stream:
+        tail.append(line.decode(errors='replace').rstrip() if isinstance(line, bytes) else line.rstrip())
+
+
+# Lossless 16-bit depth video
+DEPTH_VIDEO_ARGS = ('-c:v', 'ffv1', '-pix_fmt', 'gray16le')
+# draft previews favour encoding speed over size and quality
+DRAFT_VIDEO_ARGS = ('-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '30', '-pix_fmt', 'yuv420p')
+
+
+class FFmpegRawVideoWriter:
+    """Pipes raw frames into an ffmpeg process so encoding overlaps rendering.
+
+    The ffmpeg process is started on the first frame, once the frame size is known.
+    stderr is drained on a background thread so a chatty encoder never blocks the
+    pipe; its last lines are reported if ffmpeg fails.
+    """
+
+    def __init__(self, path, fps, pix_fmt="rgb24", output_args=("-pix_fmt", "yuv420p")):
+        self.path = path
+        self.fps = fps
+        self.pix_fmt = pix_fmt
+        self.output_args = list(output_args)
+        self.proc = None
+        self.frames_written = 0
+        self._stderr_tail = deque(maxlen=50)
+        self._stderr_thread = None
+
+    def _start(self, width, height):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        cmd = [
+            get_ffmpeg_exe(), '-y',
+            '-f', 'rawvideo',
+            '-pix_fmt', self.pix_fmt,
+            '-s', f'{width}x{height}',
+            '-framerate', str(self.fps),
+            '-i', '-',
+            *self.output_args,
+            self.path
+        ]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self._stderr_thread = threading.Thread(target=drain_lines, args=(self.proc.stderr, self._stderr_tail), daemon=True)
+        self._stderr_thread.start()
+
+    def write(self, frame):
+        """Writes one (H,W,C) or (H,W) frame matching pix_fmt"""
+        frame = np.ascontiguousarray(frame)
+        if self.proc is None:
+            self._start(frame.shape[1], frame.shape[0])
+        try:
+            self.proc.stdin.write(frame.tobytes())
+        except BrokenPipeError:
+            self.close()
+        self.frames_written += 1
+
+    def close(self):
+        """Flushes the pipe and waits for ffmpeg, raising if encoding failed"""
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        if not proc.stdin.closed:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = proc.wait()
+        self._stderr_thread.join()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {returncode} writing {self.path}:\n" + "\n".join(self._stderr_tail))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def concat_videos(segment_paths, out_path):
+    """Joins videos encoded with identical settings without re-encoding"""
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as listing:
+        for segment in segment_paths:
+            listing.write(f"file '{os.path.abspath(segment)}'\n")
+    try:
+        cmd = [get_ffmpeg_exe(), '-y', '-f', 'concat', '-safe', '0', '-i', listing.name, '-c', 'copy', out_path]
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg concat failed:\n{proc.stderr}")
+    finally:
+        os.remove(listing.name)
+
+
+def run_ffmpeg(args, progress=None):
+    """Runs ffmpeg with args, reporting encoded frames to a ProgressReporter through -progress pipe:1.
+
+    stdout carries the key=value progress blocks and is parsed as it arrives, while
+    stderr is drained on a background thread, so neither pipe can stall ffmpeg.
+    Raises RuntimeError with the last stderr lines if ffmpeg fails.
+    """
+    cmd = [get_ffmpeg_exe(), '-nostats', '-progress', 'pipe:1', *args]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+    stderr_tail = deque(maxlen=50)
+    stderr_thread = threading.Thread(target=drain_lines, args=(proc.stderr, stderr_tail), daemon=True)
+    stderr_thread.start()
+
+    block = {}
+    for line in proc.stdout:
+        key, _, value = line.strip().partition('=')
+        block[key] = value
+        if key == 'progress':
+            # a block of key=value lines ends with progress=continue or progress=end
+            if progress is not None and block.get('frame', '').isdigit():
+                try:
+                    fps = float(block.get('fps', 0))
+                except ValueError:
+                    fps = 0.0
+                progress.set(int(block['frame']), rate=fps or None)
+            block = {}
+
+    returncode = proc.wait()
+    stderr_thread.join()
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {returncode}:\n" + "\n".join(stderr_tail))
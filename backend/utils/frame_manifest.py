@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+MANIFEST_NAME = "manifest.json"
+FRAME_DIRS = ("image", "depth")
+
+
+def array_hash(*arrays):
+    """sha1 of the raw bytes of numpy arrays, e.g. to identify a point cloud"""
+    digest = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        digest.update(str(a.dtype).encode() + str(a.shape).encode())
+        digest.update(memoryview(a).cast("B"))
+    return digest.hexdigest()
+
+
+def frame_keys(poses, settings, decimals=9):
+    """One key per pose from the pose matrix (rounded to decimals) and a dict of render settings.
+
+    settings holds everything else that changes the pixels of a frame, such as the
+    intrinsics, background colour and point cloud hash.
+    """
+    base = hashlib.sha1(json.dumps(settings, sort_keys=True).encode())
+    keys = []
+    for pose in np.round(np.asarray(poses, dtype=np.float64), decimals) + 0.0:
+        digest = base.copy()
+        digest.update(pose.tobytes())
+        keys.append(digest.hexdigest())
+    return keys
+
+
+class FrameManifest:
+    """Records the key of every frame in render_folder so later runs only render frames whose key changed.
+
+    Frames that are still needed but moved to a new index are renamed instead of
+    re-rendered; frames that are no longer needed are deleted.
+    """
+
+    def __init__(self, render_folder):
+        self.render_folder = render_folder
+        self.path = os.path.join(render_folder, MANIFEST_NAME)
+        self.keys = []
+        # settings of the videos last encoded from the frames, None once the frames changed
+        self.video = None
+        if os.path.exists(self.path):
+            with open(self.path) as fid:
+                data = json.load(fid)
+            self.keys = data.get("frames", [])
+            self.video = data.get("video")
+
+    def frame_path(self, folder, index):
+        return os.path.join(self.render_folder, folder, f"{index:05d}.png")
+
+    def _frame_exists(self, index, folders):
+        return all(os.path.exists(self.frame_path(folder, index)) for folder in folders)
+
+    def update(self, new_keys, folders=("image",)):
+        """Reuses matching frames for new_keys and returns the indices that still have to be rendered"""
+        staging = os.path.join(self.render_folder, ".reuse")
+        shutil.rmtree(staging, ignore_errors=True)
+        wanted = set(new_keys)
+
+        # move every reusable old frame aside under its key, drop the rest
+        staged = set()
+        for index, key in enumerate(self.keys):
+            reusable = key in wanted and key not in staged and self._frame_exists(index, folders)
+            for folder in FRAME_DIRS:
+                path = self.frame_path(folder, index)
+                if not os.path.exists(path):
+                    continue
+                if reusable:
+                    os.makedirs(os.path.join(staging, folder), exist_ok=True)
+                    os.replace(path, os.path.join(staging, folder, f"{key}.png"))
+                else:
+                    os.remove(path)
+            if reusable:
+                staged.add(key)
+        for folder in FRAME_DIRS:
+            frame_dir = os.path.join(self.render_folder, folder)
+            if os.path.isdir(frame_dir):
+                for name in os.listdir(frame_dir):
+                    os.remove(os.path.join(frame_dir, name))
+
+        # place staged frames at their new indices
+        to_render = []
+        placed = {}
+        for index, key in enumerate(new_keys):
+            if key not in staged:
+                to_render.append(index)
+                continue
+            for folder in folders:
+                os.makedirs(os.path.join(self.render_folder, folder), exist_ok=True)
+                src = os.path.join(staging, folder, f"{key}.png")
+                if key in placed:
+                    shutil.copyfile(self.frame_path(folder, placed[key]), self.frame_path(folder, index))
+                else:
+                    os.replace(src, self.frame_path(folder, index))
+            placed.setdefault(key, index)
+        shutil.rmtree(staging, ignore_errors=True)
+
+        if list(new_keys) != self.keys:
+            self.video = None
+        # frames about to be rendered are not valid until the render completes
+        rendering = set(to_render)
+        self.keys = [None if index in rendering else key for index, key in enumerate(new_keys)]
+        self.pending = list(new_keys)
+        self.save()
+        return to_render
+
+    def commit(self):
+        """Marks every frame passed to the last update as rendered"""
+        self.keys = self.pending
+        self.save()
+
+    def reset(self, keys=()):
+        """Replaces the recorded keys, e.g. after a full render or when frames were deleted"""
+        self.keys = list(keys)
+        self.video = None
+        self.save()
+
+    def encoded(self, video):
+        """Records the settings of the videos just encoded from the frames"""
+        self.video = video
+        self.save()
+
+    def save(self):
+        os.makedirs(self.render_folder, exist_ok=True)
+        with open(self.path, "w") as fid:
+            json.dump({"frames": self.keys, "video": self.video}, fid)
@@ -0,0 +1,76 @@
+import json
+import sys
+import traceback
+
+from .profiling import emit_event
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+SERVER_ERROR = -32000
+
+
+def _error(code, message, data=None):
+    error = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+    return error
+
+
+def handle_request(methods, request):
+    """Calls the method named by a decoded JSON-RPC request and returns (response, stop).
+
+    params may be a list (positional) or a dict (keyword) arguments. SystemExit raised
+    by a method (e.g. sys.exit or an argparse error) becomes an error response rather
+    than ending the service. response is None for notifications (requests without an id).
+    """
+    if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+        return {"jsonrpc": "2.0", "id": None, "error": _error(INVALID_REQUEST, "Invalid request")}, False
+    request_id = request.get("id")
+    name = request["method"]
+    params = request.get("params", [])
+    result, error = None, None
+    if name not in methods:
+        error = _error(METHOD_NOT_FOUND, f"Method not found: {name}")
+    else:
+        try:
+            result = methods[name](**params) if isinstance(params, dict) else methods[name](*params)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                error = _error(SERVER_ERROR, e.code if isinstance(e.code, str) else f"{name} exited with code {e.code}")
+        except Exception as e:
+            error = _error(SERVER_ERROR, f"{type(e).__name__}: {e}", traceback.format_exc())
+    stop = name == "shutdown" and error is None
+    if "id" not in request:
+        return None, stop
+    response = {"jsonrpc": "2.0", "id": request_id}
+    if error is None:
+        response["result"] = result
+    else:
+        response["error"] = error
+    return response, stop
+
+
+def serve(methods, stdin=None, stdout=None):
+    """Answers JSON-RPC 2.0 requests, one per line on stdin, until a shutdown request or EOF.
+
+    Responses share stdout with the log and event lines printed while a request runs;
+    clients tell them apart by the "jsonrpc" key. Requests are handled one at a time.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            emit_event({"jsonrpc": "2.0", "id": None, "error": _error(PARSE_ERROR, f"Parse error: {e}")}, stdout)
+            continue
+        response, stop = handle_request(methods, request)
+        if response is not None:
+            emit_event(response, stdout)
+        if stop:
+            break
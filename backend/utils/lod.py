@@ -0,0 +1,97 @@
+import json
+import os
+
+import numpy as np
+
+from .ply_stream import ply_header, ply_vertices
+from .scene_cache import replacing
+
+LOD_MANIFEST_NAME = "pointcloud_lod.json"
+
+
+def voxel_downsample(xyz, rgb, voxel_size, origin=None):
+    """Averages the points and colours falling in each voxel of size voxel_size.
+
+    Returns (xyz, rgb, coords, counts): coords are the integer voxel coordinates,
+    which can be halved to coarsen further without revisiting the input points, and
+    counts the number of input points merged into each voxel.
+    """
+    origin = xyz.min(axis=0) if origin is None else origin
+    coords = np.floor((xyz - origin) / voxel_size).astype(np.int64)
+    return _merge_voxels(coords, xyz, rgb)
+
+
+def _merge_voxels(coords, xyz, rgb, weights=None):
+    coords = coords - coords.min(axis=0)
+    dims = coords.max(axis=0) + 1
+    keys = (coords[:, 0] * dims[1] + coords[:, 1]) * dims[2] + coords[:, 2]
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    weights = np.ones(len(xyz)) if weights is None else weights
+    counts = np.bincount(inverse, weights=weights, minlength=len(unique_keys))
+    merged_xyz = np.stack([np.bincount(inverse, weights=weights * xyz[:, i], minlength=len(unique_keys)) for i in range(3)], axis=1)
+    merged_rgb = np.stack([np.bincount(inverse, weights=weights * rgb[:, i], minlength=len(unique_keys)) for i in range(3)], axis=1)
+    return merged_xyz / counts[:, None], merged_rgb / counts[:, None], coords[first], counts
+
+
+def build_lods(xyz, rgb, budgets, base_divisions=4096):
+    """Voxel-downsampled levels of detail, one per point budget, coarsest first.
+
+    A fine grid with base_divisions cells along the longest bounding box side is
+    built once; each coarser grid halves the voxel coordinates of the previous one.
+    Every budget gets the finest grid whose voxel count fits in it. Budgets at or
+    above the number of points are skipped. Returns a list of dicts with the
+    budget, voxel size and the (M,3) float64 xyz and (M,3) uint8 rgb of the level.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64)
+    rgb = np.asarray(rgb, dtype=np.float64)
+    budgets = sorted(b for b in budgets if b < len(xyz))
+    if not budgets:
+        return []
+    extent = max(float(np.ptp(xyz, axis=0).max()), 1e-9)
+    voxel_size = extent / base_divisions
+    level_xyz, level_rgb, coords, weights = voxel_downsample(xyz, rgb, voxel_size)
+
+    levels = []
+    for budget in reversed(budgets):
+        while len(level_xyz) > budget:
+            voxel_size *= 2
+            level_xyz, level_rgb, coords, weights = _merge_voxels(coords // 2, level_xyz, level_rgb, weights)
+        levels.append({
+            "budget": int(budget),
+            "voxel_size": voxel_size,
+            "xyz": level_xyz,
+            "rgb": np.clip(np.round(level_rgb), 0, 255).astype(np.uint8),
+        })
+    return levels[::-1]
+
+
+def write_ply_binary(path, xyz, rgb):
+    """Writes a binary little-endian PLY with float32 xyz and uchar colours, replacing any file at path"""
+    with replacing(path) as tmp, open(tmp, "wb") as fid:
+        fid.write(ply_header(len(xyz)))
+        fid.write(ply_vertices(xyz, rgb).tobytes())
+
+
+def write_lods(levels, out_dir, include_full=False):
+    """Writes pointcloud_lod<i>.ply files (0 is coarsest) and the pointcloud_lod.json manifest.
+
+    include_full tells the preview to load the full resolution pointcloud.ply after the levels.
+    """
+    manifest = {"levels": [], "include_full": include_full}
+    for i, level in enumerate(levels):
+        filename = f"pointcloud_lod{i}.ply"
+        write_ply_binary(os.path.join(out_dir, filename), level["xyz"], level["rgb"])
+        manifest["levels"].append({"file": filename, "points": int(len(level["xyz"])),
+                                   "budget": level["budget"], "voxel_size": level["voxel_size"]})
+    with replacing(os.path.join(out_dir, LOD_MANIFEST_NAME)) as tmp, open(tmp, "w") as fid:
+        json.dump(manifest, fid)
+    return manifest
+
+
+def pick_lod(manifest, point_budget):
+    """Finest manifest level with at most point_budget points, falling back to the coarsest (None without levels)"""
+    levels = manifest["levels"]
+    fitting = [level for level in levels if level["points"] <= point_budget]
+    if fitting:
+        return fitting[-1]
+    return levels[0] if levels else None
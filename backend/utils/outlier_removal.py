@@ -0,0 +1,115 @@
+import hashlib
+
+import numpy as np
+
+from .read_write_colmap_model import Points3DArrays
+
+OUTLIER_METHODS = ("none", "statistical", "radius")
+
+
+def observation_mask(points, max_error=0, min_track_length=0):
+    """Mask of the points with a reprojection error of at most max_error pixels seen in at least min_track_length images (0 = no limit)"""
+    keep = np.ones(len(points.xyz), dtype=bool)
+    if max_error:
+        keep &= np.asarray(points.error) <= max_error
+    if min_track_length:
+        if points.track_lengths is None:
+            raise ValueError("The points have no track lengths to filter on")
+        keep &= np.asarray(points.track_lengths) >= min_track_length
+    return keep
+
+
+def _neighbour_distances(xyz, k, chunk_points, workers, distance_upper_bound=np.inf):
+    """Yields (chunk, distances) over chunks of xyz, distances being the (n,k) sorted distances of the points
+    xyz[chunk] to their k nearest other points; chunk is an index array.
+
+    The KD-tree is built once and each chunk is one query spread over workers
+    threads (-1 = all CPUs), so memory stays bounded by chunk_points * k whatever the
+    size of the cloud. Chunks follow the leaf order of the tree: consecutive queries
+    then walk the same nodes, about twice as fast as querying in file order.
+    Missing neighbours (beyond distance_upper_bound, or fewer than k other points)
+    are inf.
+    """
+    from scipy.spatial import cKDTree
+    # the unbalanced tree without shrunk node boxes builds twice as fast and queries as fast
+    tree = cKDTree(xyz, balanced_tree=False, compact_nodes=False)
+    for begin in range(0, len(xyz), chunk_points):
+        chunk = tree.indices[begin:begin + chunk_points]
+        distances, _ = tree.query(xyz[chunk], k=k + 1, distance_upper_bound=distance_upper_bound, workers=workers)
+        # the nearest neighbour of every point is itself (or a duplicate of it)
+        yield chunk, distances[:, 1:]
+
+
+def statistical_outlier_mask(xyz, nb_neighbors=20, std_ratio=2.0, chunk_points=1 << 18, workers=-1):
+    """Mask of the inliers of open3d's remove_statistical_outlier: points whose mean distance to their
+    nb_neighbors nearest neighbours is at most std_ratio standard deviations above the mean over the cloud"""
+    xyz = np.asarray(xyz, dtype=np.float64)
+    nb_neighbors = min(int(nb_neighbors), len(xyz) - 1)
+    if nb_neighbors < 1:
+        return np.ones(len(xyz), dtype=bool)
+    mean_distances = np.empty(len(xyz))
+    for chunk, distances in _neighbour_distances(xyz, nb_neighbors, chunk_points, workers):
+        mean_distances[chunk] = distances.mean(axis=1)
+    return mean_distances <= mean_distances.mean() + std_ratio * mean_distances.std()
+
+
+def radius_outlier_mask(xyz, radius, nb_points=16, chunk_points=1 << 18, workers=-1):
+    """Mask of the inliers of open3d's remove_radius_outlier: points with at least nb_points other points within radius"""
+    xyz = np.asarray(xyz, dtype=np.float64)
+    nb_points = int(nb_points)
+    if nb_points < 1:
+        return np.ones(len(xyz), dtype=bool)
+    keep = np.empty(len(xyz), dtype=bool)
+    for chunk, distances in _neighbour_distances(xyz, nb_points, chunk_points, workers, distance_upper_bound=radius):
+        # the nb_points-th neighbour is found only when it lies within radius
+        keep[chunk] = np.isfinite(distances[:, -1])
+    return keep
+
+
+def select_points(points, mask):
+    """Points3DArrays of the points where mask is set, keeping their tracks when they were read"""
+    index = np.flatnonzero(mask)
+
+    def take(values):
+        return None if values is None else np.asarray(values)[index]
+
+    track_offsets = image_ids = point2D_idxs = None
+    if points.track_offsets is not None:
+        starts = points.track_offsets[index]
+        lengths = points.track_offsets[index + 1] - starts
+        track_offsets = np.zeros(len(index) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=track_offsets[1:])
+        # arange over the concatenated tracks: each one restarts at its start in the input
+        elems = np.repeat(starts - track_offsets[:-1], lengths) + np.arange(track_offsets[-1])
+        image_ids, point2D_idxs = points.image_ids[elems], points.point2D_idxs[elems]
+    return Points3DArrays(ids=take(points.ids), xyz=take(points.xyz), rgb=take(points.rgb), error=take(points.error),
+                          track_offsets=track_offsets, image_ids=image_ids, point2D_idxs=point2D_idxs,
+                          track_lengths=take(points.track_lengths))
+
+
+def clean_points(points, max_error=0, min_track_length=0, method="none", nb_neighbors=20, std_ratio=2.0, radius=0.05,
+                 chunk_points=1 << 18, workers=-1):
+    """Drops badly triangulated points and floaters from a Points3DArrays.
+
+    Points are first filtered by reprojection error and track length, which is
+    cheap, then the survivors go through KD-tree statistical or radius outlier
+    removal (method, see OUTLIER_METHODS); nb_neighbors is the neighbour count of
+    either method.
+    """
+    if method not in OUTLIER_METHODS:
+        raise ValueError(f"Unknown outlier removal method {method!r}, expected one of {OUTLIER_METHODS}")
+    keep = observation_mask(points, max_error, min_track_length)
+    if method != "none":
+        kept = np.flatnonzero(keep)
+        xyz = np.asarray(points.xyz)[kept]
+        if method == "statistical":
+            inliers = statistical_outlier_mask(xyz, nb_neighbors, std_ratio, chunk_points, workers)
+        else:
+            inliers = radius_outlier_mask(xyz, radius, nb_neighbors, chunk_points, workers)
+        keep[kept[~inliers]] = False
+    return select_points(points, keep)
+
+
+def cleaning_key(*settings):
+    """Short name for the files derived from points cleaned with settings"""
+    return "clean_" + hashlib.sha1(repr([str(s) for s in settings]).encode()).hexdigest()[:16]
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+PLY_VERTEX_DTYPE = np.dtype([("x", "<f4"), ("y", "<f4"), ("z", "<f4"), ("red", "u1"), ("green", "u1"), ("blue", "u1")])
+# digits of the vertex count in the header of a streamed PLY, enough for any uint64
+_COUNT_DIGITS = 20
+
+
+def ply_header(num_vertices, count_digits=0):
+    """Header of a binary little-endian PLY with float32 xyz and uchar colours; count_digits zero-pads the vertex count"""
+    return (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        f"element vertex {num_vertices:0{count_digits}d}\n"
+        "property float x\nproperty float y\nproperty float z\n"
+        "property uchar red\nproperty uchar green\nproperty uchar blue\n"
+        "end_header\n"
+    ).encode("ascii")
+
+
+def ply_vertices(xyz, rgb):
+    """Packs (N,3) positions and (N,3) uint8 colours into PLY vertex records"""
+    vertex = np.empty(len(xyz), dtype=PLY_VERTEX_DTYPE)
+    vertex["x"], vertex["y"], vertex["z"] = np.asarray(xyz, dtype=np.float32).T
+    vertex["red"], vertex["green"], vertex["blue"] = np.asarray(rgb, dtype=np.uint8).T
+    return vertex
+
+
+class PlyVertexWriter:
+    """Writes a binary PLY block by block, for point clouds that do not fit in memory at once.
+
+    The header is written up front with a zero-padded placeholder vertex count, which
+    is patched in place once the last block has been appended. The file is built
+    next to path and renamed into place on close, so readers never see a partial PLY.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp = f"{path}.tmp-{os.getpid()}"
+        self.count = 0
+        self.fid = open(self.tmp, "wb")
+        self.fid.write(ply_header(0, _COUNT_DIGITS))
+
+    def write(self, xyz, rgb):
+        self.fid.write(ply_vertices(xyz, rgb).tobytes())
+        self.count += len(xyz)
+
+    def close(self):
+        self.fid.seek(0)
+        self.fid.write(ply_header(self.count, _COUNT_DIGITS))
+        self.fid.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        self.fid.close()
+        os.remove(self.tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def read_ply_binary(path):
+    """Reads a PLY written by write_ply_binary or PlyVertexWriter back as (N,3) float32 xyz and (N,3) uint8 rgb"""
+    with open(path, "rb") as fid:
+        header = b""
+        while not header.endswith(b"end_header\n"):
+            line = fid.readline()
+            if not line:
+                raise ValueError(f"{path} has no PLY header")
+            header += line
+        count = header.split(b"element vertex ", 1)[-1].split(b"\n", 1)[0]
+        if not count.isdigit() or header != ply_header(int(count), len(count)):
+            raise ValueError(f"{path} is not a float32 xyz, uchar rgb binary PLY")
+        vertex = np.fromfile(fid, dtype=PLY_VERTEX_DTYPE, count=int(count))
+    xyz = np.stack([vertex["x"], vertex["y"], vertex["z"]], axis=1)
+    rgb = np.stack([vertex["red"], vertex["green"], vertex["blue"]], axis=1)
+    return xyz, rgb
@@ -0,0 +1,307 @@
+import numpy as np
+
+from .trajectory import Trajectory, as_trajectory
+
+
+def normalise_quaternions(q):
+    """Normalises an (N,4) array of quaternions"""
+    q = np.asarray(q, dtype=float)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def quaternion_multiply(q1, q2):
+    """Hamilton product of two (N,4) w x y z quaternion arrays"""
+    w1, x1, y1, z1 = np.moveaxis(q1, -1, 0)
+    w2, x2, y2, z2 = np.moveaxis(q2, -1, 0)
+    return np.stack([
+        w1*w2 - x1*x2 - y1*y2 - z1*z2,
+        w1*x2 + x1*w2 + y1*z2 - z1*y2,
+        w1*y2 - x1*z2 + y1*w2 + z1*x2,
+        w1*z2 + x1*y2 - y1*x2 + z1*w2], axis=-1)
+
+
+def quaternion_inverse(q):
+    """Inverse of an (N,4) w x y z quaternion array"""
+    conj = q * np.array([1.0, -1.0, -1.0, -1.0])
+    return conj / np.sum(q * q, axis=-1, keepdims=True)
+
+
+def quaternion_log_vec(q):
+    """Vector part of the logarithm of (N,4) unit quaternions, zero where the vector part is zero"""
+    w = q[..., 0]
+    v = q[..., 1:]
+    qnorm = np.linalg.norm(q, axis=-1)
+    vnorm = np.linalg.norm(v, axis=-1)
+    angle = np.arccos(np.clip(w / qnorm, -1.0, 1.0))
+    scale = np.divide(angle, vnorm, out=np.zeros_like(vnorm), where=vnorm > 0)
+    return v * scale[..., None]
+
+
+def quaternion_exp_vec(v):
+    """Exponential of pure (N,3) quaternions, returned as (N,4) w x y z"""
+    norm = np.linalg.norm(v, axis=-1)
+    scale = np.divide(np.sin(norm), norm, out=np.ones_like(norm), where=norm > 0)
+    return np.concatenate([np.cos(norm)[..., None], v * scale[..., None]], axis=-1)
+
+
+def wxyz_to_rotation(q):
+    """Converts (N,4) w x y z quaternions to a scipy Rotation"""
+    from scipy.spatial.transform import Rotation
+    return Rotation.from_quat(np.roll(q, -1, axis=-1))
+
+
+def catmull_rom_batch(t0, t1, t2, t3, t):
+    """Batched catmul_romm: evaluates (N,3) control points at (N,) parameters t in [0, 1]"""
+    t = np.asarray(t, dtype=float)[:, None]
+    return 0.5 * ((2 * t1) + (-t0 + t2)*t + (2*t0 - 5*t1 + 4*t2 - t3)*(t**2) + (-t0 + 3*t1 - 3*t2 + t3)*(t**3))
+
+
+def squad_intermediate(q_im1, q_i, q_ip1):
+    """Batched SQUAD helper quaternion, same formulation as squad() in app.py"""
+    q_i_inv = quaternion_inverse(q_i)
+    log_sum = quaternion_log_vec(quaternion_multiply(q_ip1, q_i_inv)) + quaternion_log_vec(quaternion_multiply(q_im1, q_i_inv))
+    return normalise_quaternions(quaternion_multiply(q_i, quaternion_exp_vec(-0.25 * log_sum)))
+
+
+def slerp_batch(r0, r1, t):
+    """Batched scipy-equivalent Slerp between Rotations r0 and r1 at (N,) parameters t"""
+    from scipy.spatial.transform import Rotation
+    return r0 * Rotation.from_rotvec((r0.inv() * r1).as_rotvec() * np.asarray(t, dtype=float)[:, None])
+
+
+def squad_batch(q0, q1, q2, q3, t):
+    """Batched squad: (N,4) w x y z control quaternions at (N,) parameters t, returns a scipy Rotation"""
+    q0, q1, q2, q3 = (normalise_quaternions(q) for q in (q0, q1, q2, q3))
+    s2 = squad_intermediate(q0, q1, q2)
+    s3 = squad_intermediate(q1, q2, q3)
+    t = np.asarray(t, dtype=float)
+    slerp1 = slerp_batch(wxyz_to_rotation(q1), wxyz_to_rotation(q2), t)
+    slerp2 = slerp_batch(wxyz_to_rotation(s2), wxyz_to_rotation(s3), t)
+    return slerp_batch(slerp1, slerp2, 2*t*(1 - t))
+
+
+def evaluate_trajectory(keyframes, seg, u):
+    """Evaluates the Catmull-Rom/SQUAD spline through keyframes at segments seg and parameters u.
+
+    keyframes is a Trajectory or (N,4,4) extrinsics. Every sample is computed in one
+    batched call. Segments at either end reuse the end keyframe as their missing
+    outer control point. Returns a Trajectory of the samples.
+    """
+    keyframes = as_trajectory(keyframes)
+    n = len(keyframes)
+    seg = np.asarray(seg, dtype=np.int64)
+    tvecs, qvecs = keyframes.t, keyframes.q
+    i0 = np.clip(seg - 1, 0, n - 1)
+    i2 = np.clip(seg + 1, 0, n - 1)
+    i3 = np.clip(seg + 2, 0, n - 1)
+
+    xyzw = squad_batch(qvecs[i0], qvecs[seg], qvecs[i2], qvecs[i3], u).as_quat()
+    q = np.roll(xyzw, 1, axis=-1)
+    q[q[:, 0] < 0] *= -1
+    return Trajectory(catmull_rom_batch(tvecs[i0], tvecs[seg], tvecs[i2], tvecs[i3], u), q)
+
+
+def interpolate_trajectory(keyframes, threshold=0.5):
+    """Vectorized replacement for the repeated interpolation_alg passes.
+
+    Takes a Trajectory (or (N,4,4) extrinsics) and returns a Trajectory with every
+    gap larger than threshold filled by Catmull-Rom (translation) and SQUAD
+    (rotation) samples. Like interpolation_alg, each pass splits every gap between
+    two poses that both have an outer neighbour at its midpoint, and the next pass
+    fits the spline through the poses inserted so far, so the output is the same
+    trajectory pose for pose. A pass is one batched evaluation over all gaps.
+
+    Beside a long first or last gap, which is never split, the midpoint can land
+    next to the same pose pass after pass, so the gap shrinks by less and less and
+    interpolation_alg never terminates. Here a gap is no longer split once a split
+    left it longer than 90% of the gap it came from; such a gap may stay above
+    threshold. Keyframes are kept as they are.
+    """
+    keyframes = as_trajectory(keyframes)
+    t, q = keyframes.t.copy(), keyframes.q.copy()
+    # length of the gap every gap was split from
+    parent = np.full(max(len(t) - 1, 0), np.inf)
+    while len(t) >= 4:
+        gaps = np.linalg.norm(np.diff(t, axis=0), axis=-1)
+        # the first and last gaps have no outer neighbour and are never split
+        seg = np.arange(1, len(t) - 2)
+        seg = seg[(gaps[seg] > threshold) & (gaps[seg] < 0.9 * parent[seg])]
+        if len(seg) == 0:
+            break
+        samples = evaluate_trajectory(Trajectory(t, q), seg, np.full(len(seg), 0.5))
+        t = np.insert(t, seg + 1, samples.t, axis=0)
+        q = np.insert(q, seg + 1, samples.q, axis=0)
+        parent = np.insert(parent, seg + 1, gaps[seg])
+        parent[seg + np.arange(len(seg))] = gaps[seg]
+    return Trajectory(t, q)
+
+
+def arc_length_samples(keyframes, num_samples, samples_per_segment=64, rotation_weight=0.1):
+    """Spline samples evenly spaced by arc length along the trajectory through the keyframes.
+
+    The arc length is the distance travelled by the camera centres along a dense
+    batched evaluation of the spline (t is world-to-camera, so it also moves when the
+    camera only turns), adding rotation_weight metres per radian of rotation so that
+    turns on the spot still get frames. Returns the segment index (num_samples,) and spline parameter (num_samples,)
+    of every sample; the first and last samples are the end keyframes.
+    """
+    keyframes = as_trajectory(keyframes)
+    n = len(keyframes)
+    if n < 2:
+        return np.zeros(num_samples, dtype=np.int64), np.zeros(num_samples)
+    grid = np.linspace(0.0, 1.0, samples_per_segment + 1)
+    dense_seg = np.repeat(np.arange(n - 1), len(grid))
+    dense_u = np.tile(grid, n - 1)
+    dense = evaluate_trajectory(keyframes, dense_seg, dense_u)
+
+    step = np.linalg.norm(np.diff(dense.camera_centres(), axis=0), axis=-1)
+    if rotation_weight > 0:
+        # angle between consecutive unit quaternions
+        cos_half = np.clip(np.abs(np.sum(dense.q[:-1] * dense.q[1:], axis=-1)), 0.0, 1.0)
+        step = step + rotation_weight * 2.0 * np.arccos(cos_half)
+    step[np.diff(dense_seg) != 0] = 0.0  # segment boundaries are the same pose
+    arc = np.concatenate([[0.0], np.cumsum(step)])
+
+    # global spline parameter: segment index + u
+    param = dense_seg + dense_u
+    if arc[-1] > 0:
+        targets = np.linspace(0.0, arc[-1], num_samples)
+        keep = np.concatenate([[True], step > 0])
+        sample_param = np.interp(targets, arc[keep], param[keep])
+    else:
+        sample_param = np.linspace(0.0, n - 1, num_samples)
+    seg = np.minimum(np.floor(sample_param).astype(np.int64), n - 2)
+    return seg, sample_param - seg
+
+
+def resample_trajectory(keyframes, num_samples, **kwargs):
+    """Samples exactly num_samples poses evenly spaced by arc length along the keyframe spline, as a Trajectory"""
+    seg, u = arc_length_samples(keyframes, num_samples, **kwargs)
+    return evaluate_trajectory(keyframes, seg, u)
+
+
+KEYFRAME_PRUNING_METHODS = ("none", "tolerance", "douglas_peucker")
+
+
+def quaternion_angles(q1, q2):
+    """Rotation angles (radians) between (N,4) unit quaternions q1 and q2"""
+    return 2.0 * np.arccos(np.clip(np.abs(np.sum(q1 * q2, axis=-1)), 0.0, 1.0))
+
+
+def slerp_quaternions(q0, q1, t):
+    """Batched slerp between (N,4) w x y z unit quaternions at (N,) parameters t, along the shortest path"""
+    t = np.asarray(t, dtype=float)[:, None]
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    q1 = np.where(dot < 0, -q1, q1)
+    theta = np.arccos(np.clip(np.abs(dot), 0.0, 1.0))
+    sin = np.sin(theta)
+    # nearly equal quaternions fall back to the linear weights
+    w0 = np.divide(np.sin((1 - t) * theta), sin, out=1 - t, where=sin > 1e-9)
+    w1 = np.divide(np.sin(t * theta), sin, out=t.copy(), where=sin > 1e-9)
+    return normalise_quaternions(w0 * q0 + w1 * q1)
+
+
+def _pose_exceeds(centres, q, i, j, translation_tol, rotation_tol):
+    """Whether poses j move more than the tolerances away from pose i (a tolerance of 0 is ignored)"""
+    moved = np.zeros(len(j), dtype=bool)
+    if translation_tol > 0:
+        moved |= np.linalg.norm(centres[j] - centres[i], axis=-1) > translation_tol
+    if rotation_tol > 0:
+        moved |= quaternion_angles(q[j], q[i]) > rotation_tol
+    return moved
+
+
+def tolerance_keyframes(keyframes, translation_tol=0.05, rotation_tol=np.radians(2.0), window=64):
+    """Indices of the keyframes kept by dropping every pose within translation_tol (metres, between camera
+    centres) and rotation_tol (radians) of the last kept one. The first and last keyframes are always kept,
+    and every keyframe is kept when both tolerances are 0.
+
+    The next pose to keep is searched with vectorized comparisons over a window of
+    following poses, doubled until one of them moves enough, so a long stationary
+    stretch costs a handful of numpy calls rather than one per pose.
+    """
+    keyframes = as_trajectory(keyframes)
+    n = len(keyframes)
+    if translation_tol <= 0 and rotation_tol <= 0:
+        return np.arange(n, dtype=np.int64)
+    centres, q = keyframes.camera_centres(), keyframes.q
+    kept = [0]
+    while kept[-1] < n - 1:
+        i = kept[-1]
+        begin, size, found = i + 1, window, None
+        while begin < n and found is None:
+            j = np.arange(begin, min(begin + size, n))
+            hit = np.flatnonzero(_pose_exceeds(centres, q, i, j, translation_tol, rotation_tol))
+            if len(hit):
+                found = int(j[hit[0]])
+            begin, size = begin + size, 2 * size
+        kept.append(n - 1 if found is None else found)
+    return np.array(kept, dtype=np.int64)
+
+
+def douglas_peucker_keyframes(keyframes, translation_tol=0.05, rotation_tol=np.radians(2.0)):
+    """Indices of the keyframes kept by Douglas-Peucker simplification of the trajectory on SE(3).
+
+    Every pose between two kept keyframes is compared with the pose interpolated
+    between them at its projection on the chord of the camera centres (linear for the
+    centre, slerp for the rotation); the pose deviating most relative to the
+    tolerances is kept and the span split there, until every pose is within both
+    tolerances of its interpolation. All open spans are processed together, level by
+    level. The first and last keyframes are always kept, and every keyframe is kept
+    when both tolerances are 0.
+    """
+    keyframes = as_trajectory(keyframes)
+    n = len(keyframes)
+    if n <= 2 or (translation_tol <= 0 and rotation_tol <= 0):
+        return np.arange(n, dtype=np.int64)
+    centres, q = keyframes.camera_centres(), keyframes.q
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+    starts, ends = np.array([0]), np.array([n - 1])
+    while len(starts):
+        inner = ends - starts - 1
+        starts, ends, inner = starts[inner > 0], ends[inner > 0], inner[inner > 0]
+        if not len(starts):
+            break
+        # every interior pose of every span, spans one after the other
+        span = np.repeat(np.arange(len(starts)), inner)
+        first = np.concatenate([[0], np.cumsum(inner)[:-1]])
+        idx = np.arange(len(span)) - first[span] + starts[span] + 1
+        a, b = starts[span], ends[span]
+        chord = centres[b] - centres[a]
+        rel = centres[idx] - centres[a]
+        chord2 = np.sum(chord * chord, axis=-1)
+        turn = quaternion_angles(q[a], q[b])
+        # spans where the camera centre barely moves (turning on the spot) are parameterised
+        # by the rotation from the first pose instead, and by pose index when nothing moves
+        s = np.divide(quaternion_angles(q[a], q[idx]), turn, out=(idx - a) / (b - a), where=turn > 1e-9)
+        moving = chord2 > max(translation_tol, 1e-6) ** 2
+        s[moving] = np.sum(rel[moving] * chord[moving], axis=-1) / chord2[moving]
+        s = np.clip(s, 0.0, 1.0)
+        error = np.zeros(len(idx))
+        if translation_tol > 0:
+            error = np.maximum(error, np.linalg.norm(rel - s[:, None] * chord, axis=-1) / translation_tol)
+        if rotation_tol > 0:
+            error = np.maximum(error, quaternion_angles(q[idx], slerp_quaternions(q[a], q[b], s)) / rotation_tol)
+        # the worst pose of each span is the last one of the span once sorted by error
+        order = np.lexsort((error, span))
+        worst = order[np.cumsum(inner) - 1]
+        split = error[worst] > 1.0
+        worst = idx[worst[split]]
+        keep[worst] = True
+        starts, ends = np.concatenate([starts[split], worst]), np.concatenate([worst, ends[split]])
+    return np.flatnonzero(keep)
+
+
+def prune_keyframes(keyframes, method="tolerance", translation_tol=0.05, rotation_tol=np.radians(2.0)):
+    """Drops redundant keyframes (see KEYFRAME_PRUNING_METHODS) and returns the kept ones as a Trajectory"""
+    keyframes = as_trajectory(keyframes)
+    if method == "none" or len(keyframes) == 0:
+        return keyframes
+    if method == "tolerance":
+        kept = tolerance_keyframes(keyframes, translation_tol, rotation_tol)
+    elif method == "douglas_peucker":
+        kept = douglas_peucker_keyframes(keyframes, translation_tol, rotation_tol)
+    else:
+        raise ValueError(f"Unknown keyframe pruning method {method!r}, expected one of {KEYFRAME_PRUNING_METHODS}")
+    return keyframes[kept]
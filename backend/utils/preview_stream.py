@@ -0,0 +1,63 @@
+import struct
+
+import numpy as np
+
+from .scene_cache import replacing
+
+PREVIEW_NAME = "pointcloud_preview.pcq"
+PREVIEW_MAGIC = b"PCQ1"
+
+# File header: magic, point count, chunk count, bounding box minimum and quantization step (float32 x, y, z each)
+PREVIEW_HEADER = struct.Struct("<4sII3f3f")
+# Chunk header: points in the chunk, payload bytes that follow
+PREVIEW_CHUNK_HEADER = struct.Struct("<II")
+
+
+def quantize_positions(xyz):
+    """Quantizes (N,3) positions to uint16 steps of the bounding box. Returns (q, origin, step); xyz ~ origin + q * step"""
+    xyz = np.asarray(xyz, dtype=np.float64)
+    origin = xyz.min(axis=0) if len(xyz) else np.zeros(3)
+    extent = xyz.max(axis=0) - origin if len(xyz) else np.zeros(3)
+    step = np.where(extent > 0, extent / 65535.0, 1.0)
+    q = np.clip(np.round((xyz - origin) / step), 0, 65535).astype("<u2")
+    return q, origin.astype(np.float32), step.astype(np.float32)
+
+
+def write_preview(path, xyz, rgb, chunk_points=65536, seed=0):
+    """Writes the compact preview stream read by the Electron app.
+
+    Positions are quantized to 16 bits per axis relative to the bounding box and
+    colours kept as uint8, 9 bytes per point. Points are shuffled so every chunk is
+    a uniform sample of the scene and the preview fills in evenly while streaming.
+    Each chunk holds its uint16 positions then its uint8 colours, padded to 4 bytes.
+    """
+    q, origin, step = quantize_positions(xyz)
+    rgb = np.asarray(rgb, dtype=np.uint8)
+    order = np.random.default_rng(seed).permutation(len(q))
+    num_chunks = -(-len(q) // chunk_points)
+    with replacing(path) as tmp, open(tmp, "wb") as fid:
+        fid.write(PREVIEW_HEADER.pack(PREVIEW_MAGIC, len(q), num_chunks, *origin, *step))
+        for begin in range(0, len(q), chunk_points):
+            chunk = order[begin:begin + chunk_points]
+            payload = q[chunk].tobytes() + rgb[chunk].tobytes()
+            payload += b"\0" * (-len(payload) % 4)
+            fid.write(PREVIEW_CHUNK_HEADER.pack(len(chunk), len(payload)))
+            fid.write(payload)
+
+
+def read_preview(path):
+    """Reads a preview stream back as (xyz float32, rgb uint8) in stream order"""
+    with open(path, "rb") as fid:
+        magic, num_points, num_chunks, *box = PREVIEW_HEADER.unpack(fid.read(PREVIEW_HEADER.size))
+        if magic != PREVIEW_MAGIC:
+            raise ValueError(f"{path} is not a point cloud preview stream")
+        origin, step = np.array(box[:3], dtype=np.float32), np.array(box[3:], dtype=np.float32)
+        xyz, rgb = [], []
+        for _ in range(num_chunks):
+            count, size = PREVIEW_CHUNK_HEADER.unpack(fid.read(PREVIEW_CHUNK_HEADER.size))
+            payload = fid.read(size)
+            xyz.append(np.frombuffer(payload, dtype="<u2", count=3 * count).reshape(-1, 3) * step + origin)
+            rgb.append(np.frombuffer(payload, dtype=np.uint8, count=3 * count, offset=6 * count).reshape(-1, 3))
+    if not xyz:
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.uint8)
+    return np.concatenate(xyz).astype(np.float32), np.concatenate(rgb)
@@ -0,0 +1,86 @@
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where the resource module is unavailable)"""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1 << 20) if sys.platform == "darwin" else maxrss / 1024
+
+
+def emit_event(event, stream=None):
+    """Writes one event dict as a JSON line, the machine-readable channel read by main.js"""
+    stream = stream or sys.stdout
+    stream.write(json.dumps(event) + "\n")
+    stream.flush()
+
+
+class StageRecord:
+    """Mutable record handed to the body of a stage, so it can report how many items it processed"""
+
+    def __init__(self, name, items=None, unit=None):
+        self.name = name
+        self.items = items
+        self.unit = unit
+
+
+class StageProfiler:
+    """Times named backend stages and emits a {"type": "profile", ...} JSON line when each one ends.
+
+    When disabled, stage() only runs its body. With profile_dir set, every stage is
+    also run under cProfile and its stats are dumped to <profile_dir>/<stage>.prof
+    (view with python -m pstats). Work done in render worker processes is timed as
+    part of the stage that starts them but not profiled.
+    """
+
+    def __init__(self, enabled=False, profile_dir=None):
+        self.enabled = enabled
+        self.profile_dir = profile_dir if enabled else None
+        self.records = []
+        self._start = time.perf_counter()
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name, items=None, unit=None):
+        record = StageRecord(name, items, unit)
+        if not self.enabled:
+            yield record
+            return
+        profiler = cProfile.Profile() if self.profile_dir else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            event = {"type": "profile", "stage": name, "wall_s": round(wall, 6), "cpu_s": round(cpu, 6),
+                     "items": record.items, "unit": record.unit, "peak_rss_mb": peak_rss_mb()}
+            if record.items and wall > 0:
+                event["items_per_s"] = record.items / wall
+            if profiler:
+                event["pstats"] = os.path.join(self.profile_dir, f"{name}.prof")
+                profiler.dump_stats(event["pstats"])
+            self.records.append(event)
+            emit_event(event)
+
+    def summary(self):
+        """Emits a {"type": "profile_summary"} line with every stage and the total wall time"""
+        if not self.enabled:
+            return
+        emit_event({"type": "profile_summary", "total_wall_s": round(time.perf_counter() - self._start, 6),
+                    "peak_rss_mb": peak_rss_mb(), "stages": self.records})
@@ -0,0 +1,85 @@
+import sys
+import time
+
+from .profiling import emit_event
+
+# "bar": tqdm progress bar, "json": {"type": "progress"} lines for main.js, "auto": bar on a terminal, json otherwise
+PROGRESS_FORMATS = ("auto", "bar", "json")
+_progress_format = "auto"
+
+
+def set_progress_format(fmt):
+    global _progress_format
+    if fmt not in PROGRESS_FORMATS:
+        raise ValueError(f"Unknown progress format {fmt}, expected one of {PROGRESS_FORMATS}")
+    _progress_format = fmt
+
+
+def progress_as_json():
+    if _progress_format == "auto":
+        return not sys.stdout.isatty()
+    return _progress_format == "json"
+
+
+class ProgressReporter:
+    """Reports progress of a stage with a known total, as a tqdm bar or as JSON progress events.
+
+    Events carry the stage, items done and total, the rate (items/s) and the ETA in
+    seconds, and are rate-limited to one every min_interval seconds except for the
+    first and the last one.
+    """
+
+    def __init__(self, stage, total, unit="frame", desc=None, min_interval=0.5):
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.min_interval = min_interval
+        self._start = time.perf_counter()
+        self._last_emit = None
+        self._closed = False
+        self._bar = None
+        if not progress_as_json():
+            from tqdm import tqdm
+            self._bar = tqdm(total=total, desc=desc or stage, unit=unit, file=sys.stdout)
+        else:
+            self._emit(force=True)
+
+    def update(self, n=1):
+        self.set(self.done + n)
+
+    def set(self, done, rate=None):
+        """Sets the number of items done; rate overrides the average rate, e.g. with the fps ffmpeg reports"""
+        if self._bar is not None:
+            self._bar.update(done - self.done)
+        self.done = done
+        if self._bar is None:
+            self._emit(rate=rate, force=done >= self.total)
+
+    def _emit(self, rate=None, force=False):
+        now = time.perf_counter()
+        if not force and self._last_emit is not None and now - self._last_emit < self.min_interval:
+            return
+        self._last_emit = now
+        elapsed = now - self._start
+        if rate is None:
+            rate = self.done / elapsed if elapsed > 0 and self.done else None
+        eta = (self.total - self.done) / rate if rate else None
+        emit_event({"type": "progress", "stage": self.stage, "done": self.done, "total": self.total, "unit": self.unit,
+                    "rate": round(rate, 3) if rate else None, "elapsed_s": round(elapsed, 3),
+                    "eta_s": round(max(eta, 0.0), 3) if eta is not None else None})
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._bar is not None:
+            self._bar.close()
+        elif self._last_emit is None or self.done < self.total:
+            self._emit(force=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
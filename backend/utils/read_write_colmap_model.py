@@ -29,8 +29,12 @@
 
 
 import argparse
+import array
 import collections
+import itertools
+import mmap
 import os
+import re
 import struct
 
 import numpy as np
@@ -47,6 +51,31 @@ BaseImage = collections.namedtuple(
 Point3D = collections.namedtuple(
     "Point3D", ["id", "xyz", "rgb", "error", "image_ids", "point2D_idxs"]
 )
+ImagePoses = collections.namedtuple(
+    "ImagePoses", ["ids", "qvecs", "tvecs", "camera_ids", "names"]
+)
+Points3DArrays = collections.namedtuple(
+    "Points3DArrays",
+    [
+        "ids",
+        "xyz",
+        "rgb",
+        "error",
+        "track_offsets",
+        "image_ids",
+        "point2D_idxs",
+        "track_lengths",
+    ],
+    defaults=(None,),
+)
+
+# Fixed-size head of a points3D.bin record: POINT3D_ID, XYZ, RGB, ERROR.
+# It is followed by TRACK_LENGTH (uint64) and TRACK_LENGTH (int32, int32) pairs.
+POINT3D_BINARY_HEAD_DTYPE = np.dtype(
+    [("id", "<u8"), ("xyz", "<f8", (3,)), ("rgb", "u1", (3,)), ("error", "<f8")]
+)
+POINT3D_BINARY_HEAD_SIZE = POINT3D_BINARY_HEAD_DTYPE.itemsize  # 43
+POINT3D_BINARY_TRACK_ELEM_SIZE = 8
 
 
 class Image(BaseImage):
@@ -294,6 +323,103 @@ def read_images_binary(path_to_model_file):
     return images
 
 
+IMAGE_BINARY_HEAD = struct.Struct("<idddddddi")
+FRAME_NUMBER_RE = re.compile(r"_(\d+)")
+
+
+def image_timestamp(name):
+    """
+    Frame number of an image named like frame_%06d.png, or None when the
+    name has no _<digits> part.
+    """
+    match = FRAME_NUMBER_RE.search(os.path.splitext(os.path.basename(name))[0])
+    return int(match.group(1)) if match else None
+
+
+def sort_image_poses(poses):
+    """
+    Sorts an ImagePoses by image_timestamp, falling back to the image name
+    for images without one (placed after the numbered frames).
+    """
+    timestamps = [image_timestamp(name) for name in poses.names]
+    order = sorted(
+        range(len(poses.names)),
+        key=lambda i: (timestamps[i] is None, timestamps[i] or 0, poses.names[i]),
+    )
+    order = np.array(order, dtype=np.int64)
+    return ImagePoses(
+        ids=poses.ids[order],
+        qvecs=poses.qvecs[order],
+        tvecs=poses.tvecs[order],
+        camera_ids=poses.camera_ids[order],
+        names=[poses.names[i] for i in order],
+    )
+
+
+def _image_poses(ids, heads, camera_ids, names):
+    heads = np.array(heads, dtype=np.float64).reshape(-1, 7)
+    return sort_image_poses(
+        ImagePoses(
+            ids=np.array(ids, dtype=np.int64),
+            qvecs=np.ascontiguousarray(heads[:, 0:4]),
+            tvecs=np.ascontiguousarray(heads[:, 4:7]),
+            camera_ids=np.array(camera_ids, dtype=np.int64),
+            names=names,
+        )
+    )
+
+
+def read_images_text_poses(path):
+    """
+    Pose-only variant of read_images_text.
+
+    The POINTS2D line of every image is skipped without being split or
+    converted, so the cost no longer grows with the number of keypoints.
+    Returns an ImagePoses with ids (N,) int64, qvecs (N, 4), tvecs (N, 3),
+    camera_ids (N,) int64 and a list of names, sorted by image_timestamp.
+    """
+    ids, heads, camera_ids, names = [], [], [], []
+    with open(path, "rb") as fid:
+        for line in fid:
+            elems = line.split()
+            if len(elems) == 0 or elems[0][:1] == b"#":
+                continue
+            ids.append(int(elems[0]))
+            heads.append([float(elem) for elem in elems[1:8]])
+            camera_ids.append(int(elems[8]))
+            names.append(elems[9].decode("utf-8"))
+            next(fid, None)  # POINTS2D[] as (X, Y, POINT3D_ID)
+    return _image_poses(ids, heads, camera_ids, names)
+
+
+def read_images_binary_poses(path_to_model_file):
+    """
+    Pose-only variant of read_images_binary.
+
+    The file is memory-mapped and the POINTS2D block of every image is
+    skipped by its length, so it is never read. See read_images_text_poses
+    for the returned layout.
+    """
+    ids, heads, camera_ids, names = [], [], [], []
+    with open(path_to_model_file, "rb") as fid:
+        num_reg_images = read_next_bytes(fid, 8, "Q")[0]
+        if num_reg_images == 0:
+            return _image_poses(ids, heads, camera_ids, names)
+        with mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 8
+            for _ in range(num_reg_images):
+                head = IMAGE_BINARY_HEAD.unpack_from(data, offset)
+                offset += IMAGE_BINARY_HEAD.size
+                name_end = data.find(b"\x00", offset)
+                ids.append(head[0])
+                heads.append(head[1:8])
+                camera_ids.append(head[8])
+                names.append(data[offset:name_end].decode("utf-8"))
+                num_points2D = struct.unpack_from("<Q", data, name_end + 1)[0]
+                offset = name_end + 1 + 8 + 24 * num_points2D
+    return _image_poses(ids, heads, camera_ids, names)
+
+
 def write_images_text(images, path):
     """
     see: src/colmap/scene/reconstruction.cc
@@ -387,6 +513,149 @@ def read_points3D_text(path):
     return points3D
 
 
+def read_points3D_text_arrays(path, with_tracks=False):
+    """
+    Columnar variant of read_points3D_text.
+
+    Returns a Points3DArrays with contiguous ids (N,) int64, xyz (N, 3)
+    float64, rgb (N, 3) uint8, error (N,) float64 and track_lengths (N,)
+    int64 arrays. Tracks are only parsed when with_tracks is set and are
+    then stored in CSR form: the track of point i is
+    image_ids[track_offsets[i]:track_offsets[i+1]] (and likewise for
+    point2D_idxs). Otherwise the track fields are None.
+    """
+    with open(path, "r") as fid:
+        return _parse_points3D_text_lines(fid, with_tracks)
+
+
+def iter_points3D_text_chunks(path, chunk_points=1 << 20):
+    """
+    Streams points3D.txt as Points3DArrays of at most chunk_points
+    points each, without tracks, so that memory use is bounded by the
+    chunk size rather than by the size of the file.
+    """
+    with open(path, "r") as fid:
+        while True:
+            lines = list(itertools.islice(fid, chunk_points))
+            if not lines:
+                return
+            points = _parse_points3D_text_lines(lines)
+            if len(points.ids):
+                yield points
+
+
+def _parse_points3D_text_lines(lines, with_tracks=False):
+    """Parses lines of points3D.txt into a Points3DArrays, skipping comments."""
+    ids = []
+    columns = []
+    tracks = []
+    lengths = []
+    for line in lines:
+        elems = line.split(None, 8)
+        if len(elems) == 0 or elems[0][0] == "#":
+            continue
+        ids.append(elems[0])
+        columns.append(" ".join(elems[1:8]))
+        track = elems[8].strip() if len(elems) > 8 else ""
+        lengths.append(len(track.split()) // 2)
+        if with_tracks:
+            tracks.append(track)
+
+    num_points = len(ids)
+    if num_points == 0:
+        columns = np.empty((0, 7), dtype=np.float64)
+        ids = np.empty((0,), dtype=np.int64)
+    else:
+        columns = np.fromstring(" ".join(columns), sep=" ").reshape(-1, 7)
+        ids = np.fromstring(" ".join(ids), dtype=np.int64, sep=" ")
+
+    track_lengths = np.array(lengths, dtype=np.int64)
+    track_offsets = image_ids = point2D_idxs = None
+    if with_tracks:
+        track_offsets = np.zeros(num_points + 1, dtype=np.int64)
+        np.cumsum(track_lengths, out=track_offsets[1:])
+        if track_offsets[-1] == 0:
+            track_elems = np.empty((0, 2), dtype=np.int32)
+        else:
+            track_elems = np.fromstring(
+                " ".join(tracks), dtype=np.int32, sep=" "
+            ).reshape(-1, 2)
+        image_ids = np.ascontiguousarray(track_elems[:, 0])
+        point2D_idxs = np.ascontiguousarray(track_elems[:, 1])
+
+    return Points3DArrays(
+        ids=ids,
+        xyz=np.ascontiguousarray(columns[:, 0:3]),
+        rgb=columns[:, 3:6].astype(np.uint8),
+        error=np.ascontiguousarray(columns[:, 6]),
+        track_offsets=track_offsets,
+        image_ids=image_ids,
+        point2D_idxs=point2D_idxs,
+        track_lengths=track_lengths,
+    )
+
+
+def points3D_to_arrays(points3D, with_tracks=False):
+    """Converts a dict of Point3D namedtuples into a Points3DArrays."""
+    num_points = len(points3D)
+    values = points3D.values()
+    xyz = np.empty((num_points, 3), dtype=np.float64)
+    rgb = np.empty((num_points, 3), dtype=np.uint8)
+    for i, pt in enumerate(values):
+        xyz[i] = pt.xyz
+        rgb[i] = pt.rgb
+    track_lengths = np.fromiter(
+        (len(pt.image_ids) for pt in values), dtype=np.int64, count=num_points
+    )
+    track_offsets = image_ids = point2D_idxs = None
+    if with_tracks:
+        track_offsets = np.zeros(num_points + 1, dtype=np.int64)
+        np.cumsum(track_lengths, out=track_offsets[1:])
+        image_ids = np.concatenate(
+            [np.empty(0, dtype=np.int32)]
+            + [np.asarray(pt.image_ids, dtype=np.int32) for pt in values]
+        )
+        point2D_idxs = np.concatenate(
+            [np.empty(0, dtype=np.int32)]
+            + [np.asarray(pt.point2D_idxs, dtype=np.int32) for pt in values]
+        )
+    return Points3DArrays(
+        ids=np.fromiter(points3D.keys(), dtype=np.int64, count=num_points),
+        xyz=xyz,
+        rgb=rgb,
+        error=np.fromiter(
+            (float(pt.error) for pt in values), dtype=np.float64, count=num_points
+        ),
+        track_offsets=track_offsets,
+        image_ids=image_ids,
+        point2D_idxs=point2D_idxs,
+        track_lengths=track_lengths,
+    )
+
+
+def points3D_from_arrays(points):
+    """Converts a Points3DArrays back into a dict of Point3D namedtuples."""
+    points3D = {}
+    for i in range(len(points.ids)):
+        if points.track_offsets is not None:
+            start, end = points.track_offsets[i], points.track_offsets[i + 1]
+            image_ids = points.image_ids[start:end]
+            point2D_idxs = points.point2D_idxs[start:end]
+        else:
+            image_ids = np.empty(0, dtype=np.int32)
+            point2D_idxs = np.empty(0, dtype=np.int32)
+        point3D_id = int(points.ids[i])
+        points3D[point3D_id] = Point3D(
+            id=point3D_id,
+            xyz=points.xyz[i],
+            rgb=points.rgb[i],
+            error=float(points.error[i]),
+            image_ids=image_ids,
+            point2D_idxs=point2D_idxs,
+        )
+    return points3D
+
+
 def read_points3D_binary(path_to_model_file):
     """
     see: src/colmap/scene/reconstruction.cc
@@ -425,6 +694,172 @@ def read_points3D_binary(path_to_model_file):
     return points3D
 
 
+def index_points3D_binary(path_to_model_file):
+    """
+    Scans the variable-length records of points3D.bin once and returns the
+    byte offset of every record as an (N,) int64 array.
+    """
+    with open(path_to_model_file, "rb") as fid:
+        num_points = read_next_bytes(fid, 8, "Q")[0]
+        if num_points == 0:
+            return np.empty((0,), dtype=np.int64)
+        with mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offsets = array.array("q", bytes(8 * num_points))
+            unpack_track_length = struct.Struct("<Q").unpack_from
+            offset = 8
+            for i in range(num_points):
+                offsets[i] = offset
+                track_length = unpack_track_length(
+                    data, offset + POINT3D_BINARY_HEAD_SIZE
+                )[0]
+                offset += (
+                    POINT3D_BINARY_HEAD_SIZE
+                    + 8
+                    + POINT3D_BINARY_TRACK_ELEM_SIZE * track_length
+                )
+    return np.frombuffer(offsets, dtype=np.int64)
+
+
+def _gather_bytes(data, starts, itemsize, chunk_size=1 << 20):
+    """Copies itemsize bytes from every start offset of data into an (N, itemsize) array."""
+    out = np.empty((len(starts), itemsize), dtype=np.uint8)
+    span = np.arange(itemsize, dtype=np.int64)
+    for begin in range(0, len(starts), chunk_size):
+        end = begin + chunk_size
+        out[begin:end] = data[starts[begin:end, None] + span]
+    return out
+
+
+def iter_points3D_binary_chunks(path_to_model_file, chunk_points=1 << 20):
+    """
+    Streams points3D.bin as Points3DArrays of at most chunk_points
+    points each, without tracks.
+
+    The file is memory-mapped and scanned one chunk at a time. The pages
+    of the chunks already returned are released with madvise where it is
+    available, so the resident memory stays bounded by the chunk size
+    rather than by the size of the file.
+    """
+    release = getattr(mmap, "MADV_DONTNEED", None)
+    with open(path_to_model_file, "rb") as fid:
+        num_points = read_next_bytes(fid, 8, "Q")[0]
+        if num_points == 0:
+            return
+        with mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            unpack_track_length = struct.Struct("<Q").unpack_from
+            offset = released = 8
+            for begin in range(0, num_points, chunk_points):
+                count = min(chunk_points, num_points - begin)
+                offsets = array.array("q", bytes(8 * count))
+                lengths = array.array("q", bytes(8 * count))
+                for i in range(count):
+                    offsets[i] = offset
+                    lengths[i] = unpack_track_length(
+                        data, offset + POINT3D_BINARY_HEAD_SIZE
+                    )[0]
+                    offset += (
+                        POINT3D_BINARY_HEAD_SIZE
+                        + 8
+                        + POINT3D_BINARY_TRACK_ELEM_SIZE * lengths[i]
+                    )
+                offsets = np.frombuffer(offsets, dtype=np.int64)
+                start = int(offsets[0])
+                window = np.frombuffer(
+                    data, dtype=np.uint8, count=offset - start, offset=start
+                )
+                # small gather blocks keep the byte index temporaries small too
+                heads = _gather_bytes(
+                    window,
+                    offsets - start,
+                    POINT3D_BINARY_HEAD_SIZE,
+                    chunk_size=1 << 16,
+                )
+                # the mmap cannot be closed while a view of it is alive
+                del window
+                heads = heads.view(POINT3D_BINARY_HEAD_DTYPE).reshape(count)
+                if release is not None:
+                    end = offset - offset % mmap.PAGESIZE
+                    first = released - released % mmap.PAGESIZE
+                    if end > first:
+                        data.madvise(release, first, end - first)
+                    released = offset
+                yield Points3DArrays(
+                    ids=heads["id"].astype(np.int64),
+                    xyz=np.ascontiguousarray(heads["xyz"]),
+                    rgb=np.ascontiguousarray(heads["rgb"]),
+                    error=np.ascontiguousarray(heads["error"]),
+                    track_offsets=None,
+                    image_ids=None,
+                    point2D_idxs=None,
+                    track_lengths=np.frombuffer(lengths, dtype=np.int64),
+                )
+
+
+def read_points3D_binary_arrays(
+    path_to_model_file, with_tracks=False, offsets=None
+):
+    """
+    Columnar variant of read_points3D_binary.
+
+    The file is memory-mapped and the record heads are read through a
+    structured dtype, so no Python object is created per point. When every
+    record has the same track length the heads are a zero-copy strided view
+    of the file. offsets can be passed in from index_points3D_binary to skip
+    the scan. See read_points3D_text_arrays for the returned layout.
+    """
+    if offsets is None:
+        offsets = index_points3D_binary(path_to_model_file)
+    num_points = len(offsets)
+    data = np.memmap(path_to_model_file, dtype=np.uint8, mode="r")
+    record_sizes = np.diff(offsets, append=data.shape[0])
+    track_lengths = (
+        record_sizes - POINT3D_BINARY_HEAD_SIZE - 8
+    ) // POINT3D_BINARY_TRACK_ELEM_SIZE
+
+    if num_points > 0 and np.all(record_sizes == record_sizes[0]):
+        heads = np.ndarray(
+            shape=(num_points,),
+            dtype=POINT3D_BINARY_HEAD_DTYPE,
+            buffer=data,
+            offset=int(offsets[0]),
+            strides=(int(record_sizes[0]),),
+        )
+    else:
+        heads = _gather_bytes(data, offsets, POINT3D_BINARY_HEAD_SIZE)
+        heads = heads.view(POINT3D_BINARY_HEAD_DTYPE).reshape(num_points)
+
+    track_offsets = image_ids = point2D_idxs = None
+    if with_tracks:
+        track_offsets = np.zeros(num_points + 1, dtype=np.int64)
+        np.cumsum(track_lengths, out=track_offsets[1:])
+        elem_starts = (
+            np.repeat(
+                offsets + POINT3D_BINARY_HEAD_SIZE + 8, track_lengths
+            )
+            + (
+                np.arange(track_offsets[-1], dtype=np.int64)
+                - np.repeat(track_offsets[:-1], track_lengths)
+            )
+            * POINT3D_BINARY_TRACK_ELEM_SIZE
+        )
+        track_elems = _gather_bytes(
+            data, elem_starts, POINT3D_BINARY_TRACK_ELEM_SIZE
+        ).view("<i4")
+        image_ids = np.ascontiguousarray(track_elems[:, 0])
+        point2D_idxs = np.ascontiguousarray(track_elems[:, 1])
+
+    return Points3DArrays(
+        ids=heads["id"].astype(np.int64),
+        xyz=np.ascontiguousarray(heads["xyz"]),
+        rgb=np.ascontiguousarray(heads["rgb"]),
+        error=np.ascontiguousarray(heads["error"]),
+        track_offsets=track_offsets,
+        image_ids=image_ids,
+        point2D_idxs=point2D_idxs,
+        track_lengths=track_lengths.astype(np.int64),
+    )
+
+
 def write_points3D_text(points3D, path):
     """
     see: src/colmap/scene/reconstruction.cc
@@ -509,6 +944,40 @@ def read_model(path, ext=""):
     return cameras, images, points3D
 
 
+def read_model_arrays(path, ext="", with_tracks=False, poses_only=False):
+    """
+    Like read_model, but returns the points as a Points3DArrays. With
+    poses_only, images are read as a sorted ImagePoses without their 2D
+    observations.
+    """
+    if ext == "":
+        if detect_model_format(path, ".bin"):
+            ext = ".bin"
+        elif detect_model_format(path, ".txt"):
+            ext = ".txt"
+        else:
+            print("Provide model format: '.bin' or '.txt'")
+            return
+
+    if ext == ".txt":
+        cameras = read_cameras_text(os.path.join(path, "cameras" + ext))
+        read_images = read_images_text_poses if poses_only else read_images_text
+        images = read_images(os.path.join(path, "images" + ext))
+        points3D = read_points3D_text_arrays(
+            os.path.join(path, "points3D") + ext, with_tracks=with_tracks
+        )
+    else:
+        cameras = read_cameras_binary(os.path.join(path, "cameras" + ext))
+        read_images = (
+            read_images_binary_poses if poses_only else read_images_binary
+        )
+        images = read_images(os.path.join(path, "images" + ext))
+        points3D = read_points3D_binary_arrays(
+            os.path.join(path, "points3D") + ext, with_tracks=with_tracks
+        )
+    return cameras, images, points3D
+
+
 def write_model(cameras, images, points3D, path, ext=".bin"):
     if ext == ".txt":
         write_cameras_text(cameras, os.path.join(path, "cameras" + ext))
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from .read_write_colmap_model import Camera, ImagePoses, Points3DArrays, sort_image_poses
+
+# Bump when the on-disk layout of a cache entry changes
+CACHE_VERSION = 2
+
+MODEL_FILES = ("cameras", "images", "points3D")
+POINT_FIELDS = ("ids", "xyz", "rgb", "error", "track_lengths")
+
+
+def model_files(colmap_dir):
+    """Paths of the COLMAP model files, preferring .bin over .txt like read_model"""
+    for ext in (".bin", ".txt"):
+        paths = [os.path.join(colmap_dir, name + ext) for name in MODEL_FILES]
+        if all(os.path.isfile(path) for path in paths):
+            return paths
+    return None
+
+
+def scene_cache_key(colmap_dir, content_hash=False):
+    """Cache key of a COLMAP model: its file names with size and mtime, or their full content when content_hash is set"""
+    paths = model_files(colmap_dir)
+    if paths is None:
+        return None
+    digest = hashlib.sha1(f"v{CACHE_VERSION}".encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}".encode())
+        if content_hash:
+            with open(path, "rb") as fid:
+                for block in iter(lambda: fid.read(1 << 20), b""):
+                    digest.update(block)
+        else:
+            digest.update(f":{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+class SceneCache:
+    """Size-bounded LRU cache of parsed COLMAP scenes and the files derived from them.
+
+    Every entry is a directory named by its key. Entries are built in a temporary
+    directory and renamed into place, so a crashed run never leaves a partial entry.
+    The mtime of each entry's last_used file records when it was last read.
+    """
+
+    def __init__(self, root, max_bytes=2 << 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def touch(self, key):
+        with open(os.path.join(self.entry_dir(key), "last_used"), "w") as fid:
+            fid.write(str(time.time()))
+
+    def get(self, key):
+        """Returns the entry directory for key, or None on a miss"""
+        if key is None or not os.path.isdir(self.entry_dir(key)):
+            return None
+        self.touch(key)
+        return self.entry_dir(key)
+
+    def put(self, key, build):
+        """Creates the entry for key by calling build(entry_dir) and evicts old entries"""
+        tmp_dir = os.path.join(self.root, f".tmp-{key}-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            build(tmp_dir)
+            if os.path.isdir(self.entry_dir(key)):
+                shutil.rmtree(self.entry_dir(key))
+            os.rename(tmp_dir, self.entry_dir(key))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.touch(key)
+        self.evict(keep=key)
+        return self.entry_dir(key)
+
+    def entry_size(self, key):
+        total = 0
+        for dirpath, _, filenames in os.walk(self.entry_dir(key)):
+            for filename in filenames:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+        return total
+
+    def last_used(self, key):
+        try:
+            return os.path.getmtime(os.path.join(self.entry_dir(key), "last_used"))
+        except OSError:
+            return 0.0
+
+    def evict(self, keep=None):
+        """Removes least recently used entries until the cache fits in max_bytes"""
+        keys = [k for k in os.listdir(self.root) if not k.startswith(".") and os.path.isdir(self.entry_dir(k))]
+        sizes = {k: self.entry_size(k) for k in keys}
+        total = sum(sizes.values())
+        for k in sorted(keys, key=self.last_used):
+            if total <= self.max_bytes:
+                break
+            if k == keep:
+                continue
+            shutil.rmtree(self.entry_dir(k), ignore_errors=True)
+            total -= sizes[k]
+
+
+def save_scene(entry_dir, cameras, images, points):
+    """Writes cameras, an ImagePoses and a Points3DArrays to entry_dir as json and .npy files"""
+    meta = {
+        "cameras": [
+            {"id": int(cam.id), "model": cam.model, "width": int(cam.width), "height": int(cam.height),
+             "params": [float(p) for p in cam.params]}
+            for cam in cameras.values()
+        ],
+        "images": [
+            {"id": int(image_id), "camera_id": int(camera_id), "name": name}
+            for image_id, camera_id, name in zip(images.ids, images.camera_ids, images.names)
+        ],
+    }
+    with open(os.path.join(entry_dir, "scene.json"), "w") as fid:
+        json.dump(meta, fid)
+    np.save(os.path.join(entry_dir, "qvecs.npy"), np.asarray(images.qvecs, dtype=np.float64).reshape(-1, 4))
+    np.save(os.path.join(entry_dir, "tvecs.npy"), np.asarray(images.tvecs, dtype=np.float64).reshape(-1, 3))
+    for field in POINT_FIELDS:
+        np.save(os.path.join(entry_dir, f"points_{field}.npy"), getattr(points, field))
+
+
+def load_scene(entry_dir):
+    """Loads a scene written by save_scene as (cameras, ImagePoses sorted by timestamp, Points3DArrays); point arrays are memory-mapped"""
+    with open(os.path.join(entry_dir, "scene.json")) as fid:
+        meta = json.load(fid)
+    cameras = {
+        cam["id"]: Camera(id=cam["id"], model=cam["model"], width=cam["width"], height=cam["height"],
+                          params=np.array(cam["params"]))
+        for cam in meta["cameras"]
+    }
+    images = sort_image_poses(ImagePoses(
+        ids=np.array([img["id"] for img in meta["images"]], dtype=np.int64),
+        qvecs=np.load(os.path.join(entry_dir, "qvecs.npy")),
+        tvecs=np.load(os.path.join(entry_dir, "tvecs.npy")),
+        camera_ids=np.array([img["camera_id"] for img in meta["images"]], dtype=np.int64),
+        names=[img["name"] for img in meta["images"]]))
+    points = Points3DArrays(
+        **{field: np.load(os.path.join(entry_dir, f"points_{field}.npy"), mmap_mode="r")
+           for field in POINT_FIELDS},
+        track_offsets=None, image_ids=None, point2D_idxs=None)
+    return cameras, images, points
+
+
+@contextmanager
+def replacing(path):
+    """Yields a temporary path (with path's extension) to write to, then renames it over path.
+
+    Outputs may be hard links to files of the scene cache (see publish_file); writing
+    to them in place would change the cached file too, replacing them never does.
+    """
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.tmp-{os.getpid()}{ext}"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def publish_file(src, dst):
+    """Atomically places src at dst, hard-linking when possible instead of copying"""
+    # renaming over another link to the same file is a no-op that would leave tmp behind
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    tmp = f"{dst}.tmp-{os.getpid()}"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
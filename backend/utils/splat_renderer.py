@@ -0,0 +1,129 @@
+import struct
+import zlib
+
+import numpy as np
+
+_EMPTY = np.iinfo(np.int64).max
+
+
+class PointSplatRenderer:
+    """Renders a coloured point cloud on the CPU with numpy, without a GL context or window.
+
+    Points are projected with the pinhole intrinsics and visibility is resolved with a
+    z-buffer: every point becomes an int64 key, its float32 depth bits (which order like
+    the depths themselves, as depths are positive) above its index, and np.minimum.at
+    scatters the keys so each pixel keeps its nearest point. Points are drawn as
+    point_size x point_size squares by taking the minimum key over the square around
+    every pixel, which costs a few passes over the image rather than over the points.
+
+    With a VoxelGridIndex of the points, only the points in voxels inside the view
+    frustum are projected (unless they are most of the cloud); points and colours are
+    kept in the index's voxel order.
+    Points farther than far (metres, along the optical axis) are not drawn.
+    """
+
+    def __init__(self, points, colors, width, height, fx, fy, cx, cy, background_color=(0, 0, 0), point_size=1, near=1e-3,
+                 far=None, index=None):
+        self.index = index
+        if index is not None:
+            points, colors = np.asarray(points)[index.order], np.asarray(colors)[index.order]
+        self.points = np.ascontiguousarray(points, dtype=np.float32)
+        if len(self.points) >= 1 << 32:
+            raise ValueError(f"Too many points for the z-buffer keys: {len(self.points)}")
+        colors = np.asarray(colors)
+        if colors.dtype != np.uint8:
+            colors = (np.clip(colors, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+        # one extra colour for empty pixels, so the image is a single gather
+        background = np.asarray(background_color, dtype=np.float64)
+        if background.max() > 1.0:  # get_background_colour gives 0-255 values
+            background = background / 255.0
+        self.palette = np.vstack([colors, (np.clip(background, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)])
+        self.width = int(width)
+        self.height = int(height)
+        self.fx, self.fy, self.cx, self.cy = float(fx), float(fy), float(cx), float(cy)
+        self.point_size = max(1, int(point_size))
+        self.near = near
+        self.far = far
+
+    def zbuffer(self, pose):
+        """(H,W) int64 keys of the nearest point of every pixel (_EMPTY where no point lands) for a world-to-camera pose"""
+        subset = None
+        points = self.points
+        if self.index is not None:
+            subset = self.index.query(pose, self.width, self.height, self.fx, self.fy, self.cx, self.cy, self.near, self.far)
+            # gathering most of the cloud costs more than projecting all of it
+            if len(subset) < 0.75 * len(points):
+                points = points[subset]
+            else:
+                subset = None
+        pose = np.asarray(pose, dtype=np.float32)
+        cam = points @ pose[:3, :3].T
+        cam += pose[:3, 3]
+        z = cam[:, 2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv_z = 1.0 / z
+            # COLMAP places the centre of the top-left pixel at (0.5, 0.5)
+            u = np.floor(cam[:, 0] * inv_z * self.fx + self.cx)
+            v = np.floor(cam[:, 1] * inv_z * self.fy + self.cy)
+            inside = (z > self.near) & (u >= 0) & (u < self.width) & (v >= 0) & (v < self.height)
+            if self.far:
+                inside &= z < self.far
+            index = np.flatnonzero(inside)
+        pixel = v[index].astype(np.int64) * self.width + u[index].astype(np.int64)
+        keys = (z[index].view(np.int32).astype(np.int64) << 32) | (index if subset is None else subset[index])
+        zbuf = np.full(self.height * self.width, _EMPTY, dtype=np.int64)
+        np.minimum.at(zbuf, pixel, keys)
+        zbuf = zbuf.reshape(self.height, self.width)
+        if self.point_size > 1:
+            zbuf = self._dilate(zbuf)
+        return zbuf
+
+    def _dilate(self, zbuf):
+        """Minimum key over the point_size x point_size square of every pixel, i.e. square splats with a depth test"""
+        out = zbuf.copy()
+        lo = -((self.point_size - 1) // 2)
+        for dy in range(lo, lo + self.point_size):
+            for dx in range(lo, lo + self.point_size):
+                if dy == 0 and dx == 0:
+                    continue
+                dst = out[max(dy, 0):self.height + min(dy, 0), max(dx, 0):self.width + min(dx, 0)]
+                src = zbuf[max(-dy, 0):self.height + min(-dy, 0), max(-dx, 0):self.width + min(-dx, 0)]
+                np.minimum(dst, src, out=dst)
+        return out
+
+    def render(self, pose, render_depth=False):
+        """Returns the (H,W,3) uint8 rgb image and, with render_depth, the (H,W) float32 depth in metres (0 where empty)"""
+        zbuf = self.zbuffer(pose)
+        empty = zbuf == _EMPTY
+        index = np.where(empty, len(self.palette) - 1, zbuf & 0xFFFFFFFF)
+        rgb = self.palette[index]
+        depth = None
+        if render_depth:
+            depth = (zbuf >> 32).astype(np.int32).view(np.float32)
+            depth[empty] = 0.0
+        return rgb, depth
+
+
+def write_png(path, image, compress_level=6):
+    """Writes an (H,W,3) uint8 rgb or (H,W) uint16 grayscale image as a PNG file"""
+    image = np.asarray(image)
+    if image.ndim == 3 and image.dtype == np.uint8:
+        bit_depth, colour_type = 8, 2
+    elif image.ndim == 2 and image.dtype == np.uint16:
+        bit_depth, colour_type = 16, 0
+        image = image.astype('>u2')
+    else:
+        raise ValueError(f"Unsupported image of shape {image.shape} and dtype {image.dtype}")
+    height, width = image.shape[:2]
+    # filter type 0 (None) in front of every row
+    rows = np.zeros((height, 1 + image[0].nbytes), dtype=np.uint8)
+    rows[:, 1:] = np.ascontiguousarray(image).view(np.uint8).reshape(height, -1)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    with open(path, "wb") as fid:
+        fid.write(b"\x89PNG\r\n\x1a\n")
+        fid.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, colour_type, 0, 0, 0)))
+        fid.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), compress_level)))
+        fid.write(chunk(b"IEND", b""))
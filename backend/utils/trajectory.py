@@ -0,0 +1,153 @@
+import numpy as np
+
+
+def qvecs_to_rotmats(q):
+    """Batched qvec2rotmat: (N,4) w x y z unit quaternions to (N,3,3) rotation matrices"""
+    q = np.asarray(q, dtype=np.float64)
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    R = np.empty((len(q), 3, 3))
+    R[:, 0, 0] = 1 - 2 * y**2 - 2 * z**2
+    R[:, 0, 1] = 2 * x * y - 2 * w * z
+    R[:, 0, 2] = 2 * z * x + 2 * w * y
+    R[:, 1, 0] = 2 * x * y + 2 * w * z
+    R[:, 1, 1] = 1 - 2 * x**2 - 2 * z**2
+    R[:, 1, 2] = 2 * y * z - 2 * w * x
+    R[:, 2, 0] = 2 * z * x - 2 * w * y
+    R[:, 2, 1] = 2 * y * z + 2 * w * x
+    R[:, 2, 2] = 1 - 2 * x**2 - 2 * y**2
+    return R
+
+
+def rotmats_to_qvecs(R):
+    """Batched rotmat2qvec: (N,3,3) rotation matrices to (N,4) w x y z quaternions with w >= 0.
+
+    Closed form (Shepperd's method): every matrix uses the branch with the largest
+    diagonal term, which keeps the square root well away from zero.
+    """
+    R = np.asarray(R, dtype=np.float64)
+    R00, R01, R02 = R[:, 0, 0], R[:, 0, 1], R[:, 0, 2]
+    R10, R11, R12 = R[:, 1, 0], R[:, 1, 1], R[:, 1, 2]
+    R20, R21, R22 = R[:, 2, 0], R[:, 2, 1], R[:, 2, 2]
+    trace = R00 + R11 + R22
+    branch = np.argmax(np.stack([trace, R00, R11, R22], axis=-1), axis=-1)
+    q = np.empty((len(R), 4))
+
+    b = branch == 0
+    s = 2.0 * np.sqrt(np.maximum(1.0 + trace[b], 0.0))
+    q[b] = np.stack([0.25 * s, (R21[b] - R12[b]) / s, (R02[b] - R20[b]) / s, (R10[b] - R01[b]) / s], axis=-1)
+    b = branch == 1
+    s = 2.0 * np.sqrt(np.maximum(1.0 + R00[b] - R11[b] - R22[b], 0.0))
+    q[b] = np.stack([(R21[b] - R12[b]) / s, 0.25 * s, (R01[b] + R10[b]) / s, (R02[b] + R20[b]) / s], axis=-1)
+    b = branch == 2
+    s = 2.0 * np.sqrt(np.maximum(1.0 + R11[b] - R00[b] - R22[b], 0.0))
+    q[b] = np.stack([(R02[b] - R20[b]) / s, (R01[b] + R10[b]) / s, 0.25 * s, (R12[b] + R21[b]) / s], axis=-1)
+    b = branch == 3
+    s = 2.0 * np.sqrt(np.maximum(1.0 + R22[b] - R00[b] - R11[b], 0.0))
+    q[b] = np.stack([(R10[b] - R01[b]) / s, (R02[b] + R20[b]) / s, (R12[b] + R21[b]) / s, 0.25 * s], axis=-1)
+
+    q /= np.linalg.norm(q, axis=-1, keepdims=True)
+    q[q[:, 0] < 0] *= -1
+    return q
+
+
+def canonical_qvecs(q):
+    """(N,4) w x y z quaternions normalised with w >= 0, the form rotmat2qvec gives.
+
+    q and -q are the same rotation, but the SQUAD spline depends on the sign of its
+    control quaternions, so poses read from COLMAP files go through this.
+    """
+    q = np.array(q, dtype=np.float64).reshape(-1, 4)
+    q /= np.linalg.norm(q, axis=-1, keepdims=True)
+    q[q[:, 0] < 0] *= -1
+    return q
+
+
+class Trajectory:
+    """Camera poses as contiguous (N,3) translations t and (N,4) w x y z quaternions q.
+
+    Poses follow the COLMAP convention used throughout app.py: the matrix of pose i
+    is [R(q[i]) | t[i]], the world-to-camera extrinsic handed to open3d. Slicing
+    returns a Trajectory viewing the same arrays; an integer index, iteration and
+    np.asarray() give 4x4 matrices, so a Trajectory can stand in for a list of poses.
+    """
+
+    __slots__ = ("t", "q")
+
+    def __init__(self, t, q):
+        t = np.asarray(t, dtype=np.float64)
+        q = np.asarray(q, dtype=np.float64)
+        if t.ndim != 2 or t.shape[1] != 3 or q.shape != (len(t), 4):
+            raise ValueError(f"Expected (N,3) translations and (N,4) quaternions, got {t.shape} and {q.shape}")
+        self.t = t
+        self.q = q
+
+    @classmethod
+    def from_matrices(cls, poses):
+        """Trajectory of (N,4,4) (or (N,3,4)) pose matrices"""
+        poses = np.asarray(poses, dtype=np.float64).reshape(-1, *np.shape(poses)[-2:])
+        return cls(np.ascontiguousarray(poses[:, :3, 3]), rotmats_to_qvecs(poses[:, :3, :3]))
+
+    @classmethod
+    def from_colmap_images(cls, images):
+        """Trajectory of an iterable of COLMAP Image tuples, in iteration order"""
+        images = list(images)
+        return cls(np.array([img.tvec for img in images], dtype=np.float64).reshape(-1, 3),
+                   canonical_qvecs([img.qvec for img in images]))
+
+    @classmethod
+    def from_image_poses(cls, poses):
+        """Trajectory of an ImagePoses (read_images_*_poses), in its timestamp order"""
+        return cls(poses.tvecs, canonical_qvecs(poses.qvecs))
+
+    def as_matrices(self):
+        """(N,4,4) pose matrices"""
+        poses = np.zeros((len(self), 4, 4))
+        poses[:, :3, :3] = qvecs_to_rotmats(self.q)
+        poses[:, :3, 3] = self.t
+        poses[:, 3, 3] = 1.0
+        return poses
+
+    def rotations(self):
+        """(N,3,3) rotation matrices"""
+        return qvecs_to_rotmats(self.q)
+
+    def camera_centres(self):
+        """(N,3) camera centres in world coordinates, -R^T t"""
+        return -np.einsum('nji,nj->ni', self.rotations(), self.t)
+
+    def __len__(self):
+        return len(self.t)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self[index:index + 1 or None].as_matrices()[0]
+        return Trajectory(self.t[index], self.q[index])
+
+    def __iter__(self):
+        return iter(self.as_matrices())
+
+    def __array__(self, dtype=None, copy=None):
+        poses = self.as_matrices()
+        return poses if dtype is None else poses.astype(dtype)
+
+    def __repr__(self):
+        return f"Trajectory({len(self)} poses)"
+
+    @staticmethod
+    def concatenate(trajectories):
+        return Trajectory(np.concatenate([traj.t for traj in trajectories]), np.concatenate([traj.q for traj in trajectories]))
+
+    def save(self, path):
+        """Writes the poses to an .npy file as an (N,7) array of tx ty tz qw qx qy qz"""
+        np.save(path, np.concatenate([self.t, self.q], axis=1))
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Reads a trajectory written by save; with mmap_mode the arrays are views of the memory-mapped file"""
+        data = np.load(path, mmap_mode=mmap_mode)
+        return cls(data[:, :3], data[:, 3:])
+
+
+def as_trajectory(poses):
+    """Returns poses as a Trajectory, converting (N,4,4) matrices or a list of them"""
+    return poses if isinstance(poses, Trajectory) else Trajectory.from_matrices(poses)
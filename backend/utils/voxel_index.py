@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+
+from .scene_cache import replacing
+
+VOXEL_INDEX_NAME = "voxel_index.npz"
+
+
+class VoxelGridIndex:
+    """Uniform voxel grid over a point cloud for frustum culling.
+
+    Points are sorted by voxel once (order), so every occupied voxel is the contiguous
+    run starts[i]:starts[i] + counts[i] of the sorted points. A query tests the bounding
+    sphere of every occupied voxel against the view frustum and returns the sorted
+    positions of the points in the voxels it keeps, so the cost of a frame grows with
+    the number of voxels and visible points rather than the size of the cloud. Culling
+    is conservative: points near the frustum border may be returned, none inside it
+    are dropped.
+    """
+
+    def __init__(self, order, starts, counts, centres, voxel_size):
+        self.order = order
+        self.starts = starts
+        self.counts = counts
+        self.centres = centres
+        self.voxel_size = float(voxel_size)
+        self.radius = 0.5 * np.sqrt(3.0) * self.voxel_size
+
+    @classmethod
+    def build(cls, xyz, voxel_size=None, points_per_voxel=1024):
+        """Indexes the (N,3) xyz array. Without voxel_size, the grid aims at points_per_voxel points per voxel of the bounding box"""
+        xyz = np.asarray(xyz, dtype=np.float64)
+        origin = xyz.min(axis=0)
+        extent = np.maximum(xyz.max(axis=0) - origin, 1e-9)
+        if voxel_size is None:
+            voxel_size = float(np.cbrt(np.prod(extent) * points_per_voxel / max(len(xyz), 1)))
+            voxel_size = max(voxel_size, float(extent.max()) / 1024)
+        coords = np.floor((xyz - origin) / voxel_size).astype(np.int64)
+        dims = coords.max(axis=0) + 1
+        keys = (coords[:, 0] * dims[1] + coords[:, 1]) * dims[2] + coords[:, 2]
+        order = np.argsort(keys)
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, len(keys)])
+        cells = np.stack(np.unravel_index(keys[starts], dims), axis=1)
+        centres = origin + (cells + 0.5) * voxel_size
+        return cls(order, starts, counts, centres, voxel_size)
+
+    def visible_voxels(self, pose, width, height, fx, fy, cx, cy, near=1e-3, far=None):
+        """Indices of the voxels intersecting the frustum of a world-to-camera pose (and closer than far)"""
+        pose = np.asarray(pose, dtype=np.float64)
+        centres = self.centres @ pose[:3, :3].T + pose[:3, 3]
+        r = self.radius
+        # inward normals of the left, right, top and bottom planes through the optical centre
+        normals = np.array([[fx, 0.0, cx], [-fx, 0.0, width - cx], [0.0, fy, cy], [0.0, -fy, height - cy]])
+        normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+        keep = (centres[:, 2] > near - r) & np.all(centres @ normals.T > -r, axis=1)
+        if far:
+            keep &= centres[:, 2] < far + r
+        return np.flatnonzero(keep)
+
+    def query(self, pose, width, height, fx, fy, cx, cy, near=1e-3, far=None):
+        """Sorted positions (indices into xyz[order]) of the points in the voxels visible from pose"""
+        voxels = self.visible_voxels(pose, width, height, fx, fy, cx, cy, near, far)
+        counts = self.counts[voxels]
+        total = int(counts.sum())
+        # arange over the concatenated runs: each run restarts at its voxel's start
+        offsets = np.repeat(self.starts[voxels] - (np.cumsum(counts) - counts), counts)
+        return offsets + np.arange(total)
+
+    def save(self, path):
+        np.savez(path, order=self.order, starts=self.starts, counts=self.counts, centres=self.centres,
+                 voxel_size=self.voxel_size)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["order"], data["starts"], data["counts"], data["centres"], float(data["voxel_size"]))
+
+
+def load_or_build_index(xyz, path=None):
+    """VoxelGridIndex of xyz, read from path when it holds an index of as many points, built (and saved there) otherwise"""
+    if path and os.path.exists(path):
+        index = VoxelGridIndex.load(path)
+        if len(index.order) == len(xyz):
+            return index
+    index = VoxelGridIndex.build(xyz)
+    if path:
+        with replacing(path) as tmp:
+            index.save(tmp)
+    return index
@@ -7,6 +7,12 @@ const isPackaged = app.isPackaged;
 const resourcesBase = isPackaged ? process.resourcesPath : __dirname;
 const outputsDir = path.join(app.getPath('userData'), 'outputs');
 const os = require('os');
+const renderWorkers = Math.max(1, Math.floor(os.cpus().length / 2));
+/* Set POINTCLOUD_PROFILE_DIR to also dump cProfile stats of every backend stage */
+const profileFlags = ['--profile', ...(process.env.POINTCLOUD_PROFILE_DIR ? ['--profile_dir', process.env.POINTCLOUD_PROFILE_DIR] : [])];
+/* Set POINTCLOUD_INCREMENTAL=1 to keep PNG frames between runs and only re-render the frames that changed;
+   the video is then encoded from the frames on disk instead of streamed while rendering */
+const incrementalFlags = process.env.POINTCLOUD_INCREMENTAL === '1' ? ['--incremental'] : [];
 
 function debugLog(isError, ...args) {
   console.log(...args);
@@ -69,7 +75,7 @@ function resolveBackendRunner() {
   return preferred;
 }
 
-function spawnBackendProcess(args = [], onStdout = () => {}, onStderr = () => {}) {
+function spawnBackendProcess(args = [], onStdout = () => {}, onStderr = () => {}, stdin = 'ignore') {
   let chosen;
   try {
     chosen = resolveBackendRunner();
@@ -80,27 +86,62 @@ function spawnBackendProcess(args = [], onStdout = () => {}, onStderr = () => {}
 
   debugLog(false, 'Spawning backend runner');
   if (chosen.type === 'exe') {
-    const child = spawn(chosen.path, args, { env: process.env, stdio: ['ignore','pipe','pipe'] });
+    const child = spawn(chosen.path, args, { env: process.env, stdio: [stdin,'pipe','pipe'] });
     child.stdout.on('data', d => onStdout(d.toString()));
     child.stderr.on('data', d => onStderr(d.toString()));
     return child;
   } else {
     const script = path.join(__dirname, 'backend', 'app.py');
-    const child = spawn(chosen.path, [script, ...args], { env: process.env, stdio: ['ignore','pipe','pipe'] });
+    const child = spawn(chosen.path, [script, ...args], { env: process.env, stdio: [stdin,'pipe','pipe'] });
     child.stdout.on('data', d => onStdout(d.toString()));
     child.stderr.on('data', d => onStderr(d.toString()));
     return child;
   }
 }
 
+/* Splits a stream into lines; chunks from the pipe can end mid-line */
+function lineReader(onLine) {
+  let pending = '';
+  return (data) => {
+    const lines = (pending + data).split(/\r\n|\n|\r/);
+    pending = lines.pop();
+    for (const line of lines) {
+      if (line.trim()) onLine(line);
+    }
+  };
+}
+
+/* JSON lines printed by the backend (events, service responses), null for plain log lines */
+function parseJsonLine(line) {
+  if (!line.startsWith('{')) return null;
+  try {
+    const value = JSON.parse(line);
+    return value && typeof value === 'object' ? value : null;
+  } catch (e) {
+    return null;
+  }
+}
+
+/* Routes one backend stdout line: --profile and progress events go to the renderer, the rest to the console */
+function handleBackendLine(line) {
+  const event = parseJsonLine(line);
+  const type = event && typeof event.type === 'string' ? event.type : null;
+  if (type && type.startsWith('profile')) {
+    console.log(line);
+    if (mainWindow && mainWindow.webContents) mainWindow.webContents.send('python-profile', event);
+  } else if (type === 'progress') {
+    if (mainWindow && mainWindow.webContents) mainWindow.webContents.send('python-progress', event);
+  } else {
+    debugLog(false, line.trim());
+  }
+}
+
 function spawnBackend(flags = []) {
   return new Promise((resolve, reject) => {
     try {
       const child = spawnBackendProcess(
         flags,
-        (data) => {
-          debugLog(false, data.trim());
-        },
+        lineReader(handleBackendLine),
         (data) => {
           debugLog(true, data.trim());
         }
@@ -128,6 +169,90 @@ function spawnBackend(flags = []) {
   });
 }
 
+/* Long-lived backend (app serve) answering JSON-RPC requests on stdin/stdout, so imports, parsed
+   scenes, the point cloud and the render workers stay warm between clicks.
+   Set POINTCLOUD_BACKEND_SERVICE=0 to start a fresh backend process per request instead. */
+let useBackendService = process.env.POINTCLOUD_BACKEND_SERVICE !== '0';
+let backendService = null;
+const serviceMethodFlags = { generate_frames: ['--generate_frames'], render_video: ['--render_rgb'] };
+
+/* id of the ping sent first to every service: until it is answered, the backend may not support serve at all */
+const SERVICE_HANDSHAKE_ID = 0;
+
+function startBackendService() {
+  const service = { pending: new Map(), nextId: SERVICE_HANDSHAKE_ID + 1, ready: false };
+  service.child = spawnBackendProcess(
+    ['serve'],
+    lineReader((line) => {
+      const message = parseJsonLine(line);
+      if (!message || message.jsonrpc !== '2.0') return handleBackendLine(line);
+      if (message.id === SERVICE_HANDSHAKE_ID) {
+        service.ready = true;
+        return;
+      }
+      const call = service.pending.get(message.id);
+      if (!call) return;
+      service.pending.delete(message.id);
+      if (message.error) call.reject(new Error(message.error.data || message.error.message));
+      else call.resolve(message.result);
+    }),
+    (data) => debugLog(true, data.trim()),
+    'pipe'
+  );
+  const stop = (reason) => {
+    if (backendService === service) backendService = null;
+    const calls = [...service.pending.values()];
+    service.pending.clear();
+    if (!service.ready) {
+      /* the backend failed to start or does not support serve (e.g. an older build), so none of these calls
+         ran: run them as one-off processes. A service that crashes once running rejects its calls instead */
+      debugLog(true, `Backend service unavailable (${reason}), starting a process per request`);
+      useBackendService = false;
+      for (const call of calls) spawnBackend([...serviceMethodFlags[call.method], ...call.argv]).then(call.resolve, call.reject);
+    } else {
+      for (const call of calls) call.reject(new Error(`Backend service stopped: ${reason}`));
+    }
+  };
+  service.child.on('error', (e) => stop(e && e.message));
+  service.child.on('close', (code) => {
+    debugLog(false, 'backend service exited with code', code);
+    stop(`exit code ${code}`);
+  });
+  /* a backend that exits early closes stdin too, the close handler reports it */
+  service.child.stdin.on('error', () => {});
+  /* requests are answered in order, so the handshake is answered before any call runs */
+  service.child.stdin.write(JSON.stringify({ jsonrpc: '2.0', id: SERVICE_HANDSHAKE_ID, method: 'ping' }) + '\n');
+  return service;
+}
+
+/* Runs a backend operation (generate_frames or render_video) with extra command line flags */
+function callBackend(method, argv = []) {
+  if (!useBackendService) return spawnBackend([...serviceMethodFlags[method], ...argv]);
+  return new Promise((resolve, reject) => {
+    try {
+      if (!backendService) backendService = startBackendService();
+      const service = backendService;
+      const id = service.nextId++;
+      service.pending.set(id, { resolve, reject, method, argv });
+      service.child.stdin.write(JSON.stringify({ jsonrpc: '2.0', id, method, params: { argv } }) + '\n');
+    } catch (e) {
+      reject(e);
+    }
+  });
+}
+
+function stopBackendService() {
+  if (!backendService) return;
+  const { child } = backendService;
+  backendService = null;
+  try {
+    child.stdin.end(JSON.stringify({ jsonrpc: '2.0', method: 'shutdown' }) + '\n');
+  } catch (e) {
+    /* already gone */
+  }
+  setTimeout(() => { if (child.exitCode === null) child.kill(); }, 2000).unref();
+}
+
 let mainWindow;
 
 function createWindow() {
@@ -153,14 +278,22 @@ ipcMain.handle('select-folder', async () => {
 
 /* Event handler for running pose interpolation and frame generation */
 ipcMain.handle('run-poseinterp', (event, folderPath) => {
-  const flags = ['--colmap_dir', folderPath, '--generate_frames', '--output_dir', path.join(app.getPath('userData'), 'outputs')];
-  return spawnBackend(flags);
+  const flags = ['--colmap_dir', folderPath, '--output_dir', path.join(app.getPath('userData'), 'outputs'), '--render_workers', String(renderWorkers), ...incrementalFlags, '--progress', 'json', ...profileFlags];
+  return callBackend('generate_frames', flags);
+});
+
+/* Renders a quick low resolution preview.mp4 of the camera path and returns its file URL */
+ipcMain.handle('run-draftpreview', async (event, folderPath) => {
+  const flags = ['--colmap_dir', folderPath, '--output_dir', outputsDir, '--draft', '--progress', 'json', ...profileFlags];
+  await callBackend('generate_frames', flags);
+  /* the query string makes the video element reload a preview it already showed */
+  return `${pathToFileURL(path.join(outputsDir, 'preview.mp4')).href}?t=${Date.now()}`;
 });
 
 /* Runs video rendering with ffmpeg */
 ipcMain.handle('run-rendervideo', (event) => {
-  const flags = ['--render_rgb', '--output_dir', outputsDir];
-  return spawnBackend(flags);
+  const flags = ['--output_dir', outputsDir, '--progress', 'json', ...profileFlags];
+  return callBackend('render_video', flags);
 });
 
 /* Video download for download button */
@@ -195,16 +328,75 @@ ipcMain.handle('save-video', async () => {
 const watchedFilename = 'pointcloud.ply';
 const watchedPath = path.join(outputsDir, watchedFilename);
 
-function sendPointcloudContents() {
+const lodManifestPath = path.join(outputsDir, 'pointcloud_lod.json');
+
+/* Levels of detail written by the backend, coarsest first, ending with the full ply when it is small enough */
+function pointcloudLevels() {
+  if (!fs.existsSync(lodManifestPath)) return [watchedPath];
+  const manifest = JSON.parse(fs.readFileSync(lodManifestPath, 'utf8'));
+  const levels = manifest.levels.map(level => path.join(outputsDir, level.file));
+  if (manifest.include_full || levels.length === 0) levels.push(watchedPath);
+  return levels;
+}
+
+/* Quantized preview stream the backend writes before pointcloud.ply: a header, then chunks of uint16 positions and uint8 colours */
+const previewPath = path.join(outputsDir, 'pointcloud_preview.pcq');
+const PREVIEW_HEADER_SIZE = 36;
+const PREVIEW_CHUNK_HEADER_SIZE = 8;
+
+/* Sends the preview header and then one chunk per IPC message, so the renderer can show the cloud as it arrives */
+async function sendPreviewStream(generation) {
+  const file = await fs.promises.open(previewPath, 'r');
+  try {
+    const header = Buffer.alloc(PREVIEW_HEADER_SIZE);
+    await file.read(header, 0, PREVIEW_HEADER_SIZE, 0);
+    if (header.toString('ascii', 0, 4) !== 'PCQ1') throw new Error('not a point cloud preview stream');
+    const points = header.readUInt32LE(4);
+    const chunks = header.readUInt32LE(8);
+    const origin = [0, 1, 2].map(i => header.readFloatLE(12 + 4 * i));
+    const step = [0, 1, 2].map(i => header.readFloatLE(24 + 4 * i));
+    mainWindow.webContents.send('pointcloud-preview', { type: 'header', stream: generation, points, chunks, origin, step });
+
+    let position = PREVIEW_HEADER_SIZE;
+    let offset = 0;
+    const chunkHeader = Buffer.alloc(PREVIEW_CHUNK_HEADER_SIZE);
+    for (let index = 0; index < chunks; index++) {
+      await file.read(chunkHeader, 0, PREVIEW_CHUNK_HEADER_SIZE, position);
+      const count = chunkHeader.readUInt32LE(0);
+      const size = chunkHeader.readUInt32LE(4);
+      const payload = Buffer.alloc(size);
+      await file.read(payload, 0, size, position + PREVIEW_CHUNK_HEADER_SIZE);
+      position += PREVIEW_CHUNK_HEADER_SIZE + size;
+      if (generation !== sendGeneration) return; /* a newer update superseded this one */
+      mainWindow.webContents.send('pointcloud-preview', { type: 'chunk', stream: generation, index, offset, count, payload });
+      offset += count;
+      await new Promise(resolve => setImmediate(resolve));
+    }
+  } finally {
+    await file.close();
+  }
+}
+
+let sendGeneration = 0;
+async function sendPointcloudContents() {
+  const generation = ++sendGeneration;
   try {
     if (!mainWindow || !mainWindow.webContents) return;
     if (!fs.existsSync(watchedPath)) {
       mainWindow.webContents.send('pointcloud-error', 'PLY not found');
       return;
     }
-    const buffer = fs.readFileSync(watchedPath);
-    const b64 = buffer.toString('base64');
-    mainWindow.webContents.send('pointcloud-data', { filename: watchedPath, b64 });
+    if (fs.existsSync(previewPath)) {
+      await sendPreviewStream(generation);
+      return;
+    }
+    const levels = pointcloudLevels();
+    for (let level = 0; level < levels.length; level++) {
+      const buffer = await fs.promises.readFile(levels[level]);
+      if (generation !== sendGeneration) return; /* a newer update superseded this one */
+      const b64 = buffer.toString('base64');
+      mainWindow.webContents.send('pointcloud-data', { filename: levels[level], b64, level, levels: levels.length });
+    }
   } catch (err) {
     mainWindow.webContents.send('pointcloud-error', `Read failed: ${err.message}`);
   }
@@ -269,4 +461,6 @@ app.whenReady().then(() => {
     }    
     startWatchingOutputs();
   });
-});
\ No newline at end of file
+});
+
+app.on('will-quit', stopBackendService);
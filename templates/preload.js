@@ -4,10 +4,14 @@ contextBridge.exposeInMainWorld('electronAPI', {
   selectFolder: () => ipcRenderer.invoke('select-folder'),
   runPoseInterp: (folderPath) => ipcRenderer.invoke('run-poseinterp', folderPath),
   runRenderVideo: () => ipcRenderer.invoke('run-rendervideo'),
+  runDraftPreview: (folderPath) => ipcRenderer.invoke('run-draftpreview', folderPath),
   saveVideo: () => ipcRenderer.invoke('save-video'),
   onPythonLog: (callback) => ipcRenderer.on('python-log', (event, data) => callback(data)), /* More generally used as console log */
   onPythonError: (callback) => ipcRenderer.on('python-error', (event, data) => callback(data)), /* More generally used as console error */
+  onPythonProfile: (callback) => ipcRenderer.on('python-profile', (event, data) => callback(data)), /* --profile stage timings */
+  onPythonProgress: (callback) => ipcRenderer.on('python-progress', (event, data) => callback(data)), /* frames done/total and ETA */
   onPointCloudGenerated: (callback) => ipcRenderer.on('pointcloud-updated', (event, fileUrl) => callback(fileUrl)),
   onPointcloudData: (callback) => ipcRenderer.on('pointcloud-data', (event, data) => callback(data)),
+  onPointcloudPreview: (callback) => ipcRenderer.on('pointcloud-preview', (event, data) => callback(data)), /* quantized preview header and chunks */
   onPointcloudError: (callback) => ipcRenderer.on('pointcloud-error', (event, data) => callback(data)),
 });
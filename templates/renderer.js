@@ -100,6 +100,7 @@ let currentPoints = null;
 const loader = new PLYLoader();
 
 function clearCurrentPointcloud() {
+  previewStream = null;
   if (currentPoints) {
     scene.remove(currentPoints);
     if (currentPoints.geometry) currentPoints.geometry.dispose();
@@ -108,7 +109,15 @@ function clearCurrentPointcloud() {
   }
 }
 
-function addGeometryToScene(geometry) {
+function frameBoundingBox(bb) {
+  const center = new THREE.Vector3();
+  bb.getCenter(center);
+  controls.target.copy(center);
+  camera.position.set(center.x, center.y, center.z + (bb.getSize(new THREE.Vector3()).length() * 1.2));
+  controls.update();
+}
+
+function addGeometryToScene(geometry, keepCamera=false) {
   const hasColors = !!geometry.getAttribute('color');
   if (!hasColors) {
     geometry.setAttribute('color',
@@ -127,17 +136,95 @@ function addGeometryToScene(geometry) {
   currentPoints = points;
   scene.add(points);
 
-  geometry.computeBoundingBox();
-  const bb = geometry.boundingBox;
-  const center = new THREE.Vector3();
-  bb.getCenter(center);
-  controls.target.copy(center);
-  camera.position.set(center.x, center.y, center.z + (bb.getSize(new THREE.Vector3()).length() * 1.2));
-  controls.update();
+  if (!keepCamera) {
+    geometry.computeBoundingBox();
+    frameBoundingBox(geometry.boundingBox);
+  }
 
   appendConsoleLine('Point cloud loaded.');
 }
 
+/* Quantized preview stream: uint16 positions and uint8 colours are copied straight into normalized
+   BufferAttributes, and the Points object scales the unit cube back to the scene bounding box */
+let previewStream = null;
+
+function startPreview({ stream, points, chunks, origin, step }) {
+  const geometry = new THREE.BufferGeometry();
+  const position = new THREE.BufferAttribute(new Uint16Array(points * 3), 3, true);
+  const color = new THREE.BufferAttribute(new Uint8Array(points * 3), 3, true);
+  position.setUsage(THREE.DynamicDrawUsage);
+  color.setUsage(THREE.DynamicDrawUsage);
+  geometry.setAttribute('position', position);
+  geometry.setAttribute('color', color);
+  geometry.setDrawRange(0, 0);
+  /* bounds are known up front, so three.js never computes them from the half-filled arrays */
+  geometry.boundingBox = new THREE.Box3(new THREE.Vector3(0, 0, 0), new THREE.Vector3(1, 1, 1));
+  geometry.boundingSphere = new THREE.Sphere(new THREE.Vector3(0.5, 0.5, 0.5), Math.sqrt(3) / 2);
+
+  const material = new THREE.PointsMaterial({ size: 0.01, vertexColors: true, sizeAttenuation: true });
+  const pointsObject = new THREE.Points(geometry, material);
+  const scale = step.map(s => s * 65535);
+  pointsObject.position.set(...origin);
+  pointsObject.scale.set(...scale);
+  clearCurrentPointcloud();
+  currentPoints = pointsObject;
+  scene.add(pointsObject);
+
+  frameBoundingBox(new THREE.Box3(new THREE.Vector3(...origin),
+    new THREE.Vector3(origin[0] + scale[0], origin[1] + scale[1], origin[2] + scale[2])));
+  previewStream = { stream, points, chunks, loaded: 0, geometry };
+  appendConsoleLine(`Streaming point cloud preview (${points.toLocaleString()} points)...`);
+}
+
+/* Marks elements [start, end) of an attribute for upload, extending the range not uploaded yet */
+function markForUpload(attribute, start, end) {
+  const range = attribute.updateRange;
+  if (range.count === -1) {
+    range.offset = start;
+    range.count = end - start;
+  } else {
+    range.count = end - range.offset;
+  }
+  attribute.needsUpdate = true;
+}
+
+function appendPreviewChunk({ stream, index, offset, count, payload }) {
+  if (!previewStream || previewStream.stream !== stream) return; /* chunk of a superseded stream */
+  const geometry = previewStream.geometry;
+  const bytes = payload instanceof Uint8Array ? payload : new Uint8Array(payload);
+  /* Uint16Array views need 2-byte aligned offsets */
+  const aligned = bytes.byteOffset % 2 === 0 ? bytes : bytes.slice();
+  const positions = new Uint16Array(aligned.buffer, aligned.byteOffset, count * 3);
+  const colors = aligned.subarray(count * 6, count * 9);
+  const position = geometry.getAttribute('position');
+  const color = geometry.getAttribute('color');
+  position.array.set(positions, offset * 3);
+  color.array.set(colors, offset * 3);
+  markForUpload(position, offset * 3, (offset + count) * 3);
+  markForUpload(color, offset * 3, (offset + count) * 3);
+  previewStream.loaded = Math.max(previewStream.loaded, offset + count);
+  geometry.setDrawRange(0, previewStream.loaded);
+  if (index === previewStream.chunks - 1) {
+    appendConsoleLine('Point cloud loaded.');
+  }
+}
+
+if (window.electronAPI && window.electronAPI.onPointcloudPreview) {
+  window.electronAPI.onPointcloudPreview((message) => {
+    try {
+      if (message.type === 'header') {
+        if (reloadTimer) clearTimeout(reloadTimer);
+        reloadTimer = null;
+        startPreview(message);
+      } else if (message.type === 'chunk') {
+        appendPreviewChunk(message);
+      }
+    } catch (err) {
+      appendConsoleLine(`Failed to decode pointcloud preview: ${err.message}`, true);
+    }
+  });
+}
+
 // Old Url loading approach //
 // async function loadPointcloudFromUrl(fileUrl){
 //   try{
@@ -168,10 +255,10 @@ function addGeometryToScene(geometry) {
 // }
 
 /* New point cloud buffer loading */
-function loadPointcloudFromBuffer(arrayBuffer) {
+function loadPointcloudFromBuffer(arrayBuffer, keepCamera=false) {
   try {
     const geometry = loader.parse(arrayBuffer);
-    addGeometryToScene(geometry);
+    addGeometryToScene(geometry, keepCamera);
   } catch (err) {
     appendConsoleLine(`Error parsing pointcloud buffer: ${err.message || err}`);
     console.error(err);
@@ -199,11 +286,18 @@ function scheduleReloadFromBuffer(arrayBuffer) {
 }
 
 if (window.electronAPI && window.electronAPI.onPointcloudData) {
-  window.electronAPI.onPointcloudData(({ filename, b64 }) => {
+  window.electronAPI.onPointcloudData(({ filename, b64, level, levels }) => {
     appendConsoleLine(`Detected pointcloud (binary) update: ${filename}`);
     try {
       const arrayBuffer = base64ToArrayBuffer(b64);
-      scheduleReloadFromBuffer(arrayBuffer);
+      if (levels === undefined) {
+        scheduleReloadFromBuffer(arrayBuffer);
+      } else {
+        /* levels of detail arrive coarse to fine: show each one straight away, keeping the view after the first */
+        if (reloadTimer) clearTimeout(reloadTimer);
+        reloadTimer = null;
+        loadPointcloudFromBuffer(arrayBuffer, level > 0);
+      }
     } catch (err) {
       appendConsoleLine(`Failed to decode pointcloud data: ${err.message}`);
     }
@@ -212,6 +306,7 @@ if (window.electronAPI && window.electronAPI.onPointcloudData) {
 
 /* Button functions */
 const linkButton = document.getElementById('link-button');
+let colmapFolder = null; /* last linked COLMAP folder, reused by the draft preview */
 
 linkButton.addEventListener('click', async () => {
   const folder = await window.electronAPI.selectFolder();
@@ -219,6 +314,7 @@ linkButton.addEventListener('click', async () => {
     appendConsoleLine("Folder not found!", true)
     return;
   }
+  colmapFolder = folder;
   appendConsoleLine(`Selected folder: ${folder}. Running backend...`);
 
   try {
@@ -245,6 +341,31 @@ renderButton.addEventListener('click', async () => {
   }
 });
 
+/* Draft preview: low resolution, subsampled render of the camera path in a few seconds */
+const draftButton = document.getElementById('draft-button');
+const draftPlayer = document.getElementById('draft-player');
+
+draftButton.addEventListener('click', async () => {
+  const folder = colmapFolder || await window.electronAPI.selectFolder();
+  if (!folder) {
+    appendConsoleLine("Folder not found!", true)
+    return;
+  }
+  colmapFolder = folder;
+  draftButton.disabled = true;
+  appendConsoleLine("Rendering draft preview...");
+
+  try {
+    draftPlayer.src = await window.electronAPI.runDraftPreview(folder);
+    draftPlayer.hidden = false;
+    appendConsoleLine("Draft preview ready");
+  } catch (err) {
+    appendConsoleLine(`Error rendering draft preview:\n${err.message}`, true);
+  } finally {
+    draftButton.disabled = false;
+  }
+});
+
 const downloadButton = document.getElementById('download-button');
 
 downloadButton.addEventListener('click', async () => {
@@ -275,6 +396,45 @@ window.electronAPI.onPythonError((data) => {
   appendConsoleLine(data, true);
 });
 
+/* Progress bar driven by the backend progress events */
+const progressContainer = document.getElementById('progress-container');
+const progressBar = document.getElementById('progress-bar');
+const progressLabel = document.getElementById('progress-label');
+const progressStageNames = { render: 'Rendering frames', encode: 'Encoding video', encode_depth: 'Encoding depth' };
+
+function formatDuration(seconds) {
+  const s = Math.round(seconds);
+  return s >= 60 ? `${Math.floor(s / 60)}m ${String(s % 60).padStart(2, '0')}s` : `${s}s`;
+}
+
+window.electronAPI.onPythonProgress((event) => {
+  const total = Math.max(event.total, 1);
+  progressContainer.hidden = event.done >= event.total;
+  progressBar.value = event.done / total;
+  let text = `${progressStageNames[event.stage] || event.stage}: ${event.done}/${event.total}`;
+  if (event.rate) text += ` (${event.rate.toFixed(1)} ${event.unit}/s`;
+  if (event.rate && event.eta_s !== null) text += `, ETA ${formatDuration(event.eta_s)}`;
+  if (event.rate) text += ')';
+  progressLabel.textContent = text;
+});
+
+/* Timing summary from the backend --profile events */
+function formatStageTiming(stage) {
+  let text = `${stage.stage}: ${stage.wall_s.toFixed(2)} s (cpu ${stage.cpu_s.toFixed(2)} s`;
+  if (stage.items_per_s) text += `, ${Math.round(stage.items_per_s).toLocaleString()} ${stage.unit || 'items'}/s`;
+  if (stage.peak_rss_mb) text += `, peak ${Math.round(stage.peak_rss_mb)} MB`;
+  return text + ')';
+}
+
+window.electronAPI.onPythonProfile((event) => {
+  if (event.type !== 'profile_summary') return;
+  appendConsoleLine(`Timing summary (${event.total_wall_s.toFixed(2)} s total):`);
+  const slowest = Math.max(...event.stages.map(stage => stage.wall_s), 0);
+  for (const stage of event.stages) {
+    appendConsoleLine(`  ${formatStageTiming(stage)}${stage.wall_s === slowest ? ' <- slowest' : ''}`);
+  }
+});
+
 /* window resizing */
 function onWindowResize() {
   const width = container.clientWidth;